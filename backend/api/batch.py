@@ -0,0 +1,91 @@
+import json
+from urllib.parse import urlsplit
+
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+# Заголовки исходного запроса, которые не передаются вложенным:
+# тело и условные заголовки относятся к самому пакетному запросу,
+# а ответ вложенного запроса не сжимается.
+SKIPPED_HEADERS = frozenset((
+    'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH',
+    'HTTP_IF_MODIFIED_SINCE', 'HTTP_ACCEPT_ENCODING',
+))
+
+
+def build_subrequest(request, method, url):
+    """
+    Вложенный запрос на основе исходного: те же хост и заголовки,
+    а пользователь и токен уже определены — повторной аутентификации
+    и запроса токена к БД не будет. Анонимные запросы проходят обычную
+    аутентификацию, чтобы отказ в доступе отдавал 401, а не 403.
+    """
+    parts = urlsplit(url)
+    subrequest = HttpRequest()
+    subrequest.method = method
+    subrequest.path = subrequest.path_info = parts.path
+    subrequest.META = {
+        key: value for key, value in request.META.items()
+        if key not in SKIPPED_HEADERS
+    }
+    subrequest.META.update(
+        REQUEST_METHOD=method, PATH_INFO=parts.path,
+        QUERY_STRING=parts.query
+    )
+    subrequest.GET = QueryDict(parts.query)
+    subrequest.COOKIES = request.COOKIES
+    if request.user.is_authenticated:
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def response_body(response):
+    """Данные ответа: из DRF Response или из JSON-содержимого."""
+    if hasattr(response, 'data'):
+        return response.data
+    if response.streaming or not response.get(
+        'Content-Type', ''
+    ).startswith('application/json'):
+        return None
+    return json.loads(response.content)
+
+
+def dispatch_batch(request, items):
+    """
+    Выполняет вложенные запросы items ({method, url}) внутри процесса,
+    минуя middleware, и возвращает их статусы и данные по порядку.
+    """
+    results = []
+    for item in items:
+        subrequest = build_subrequest(request, item['method'], item['url'])
+        try:
+            match = resolve(subrequest.path_info)
+        except Resolver404:
+            results.append({
+                'status': status.HTTP_404_NOT_FOUND,
+                'body': {'detail': 'Страница не найдена.'},
+            })
+            continue
+        response = match.func(subrequest, *match.args, **match.kwargs)
+        try:
+            body = response_body(response)
+        finally:
+            response.close()
+        if body is None and response.status_code < 300 and (
+            item['method'] != 'HEAD'
+        ):
+            results.append({
+                'status': status.HTTP_406_NOT_ACCEPTABLE,
+                'body': {
+                    'detail': 'Ответ не в формате JSON, запросите '
+                              'его отдельно.'
+                },
+            })
+            continue
+        results.append({
+            'status': response.status_code,
+            'body': None if item['method'] == 'HEAD' else body,
+        })
+    return results
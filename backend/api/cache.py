@@ -0,0 +1,224 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework import status
+from rest_framework.response import Response
+
+# Версия всех списков рецептов: меняется при любом изменении рецептов.
+RECIPES_VERSION = 'recipes'
+# Версия справочных данных, встроенных в рецепт: теги, ингредиенты, авторы.
+REFERENCES_VERSION = 'references'
+# Версии справочников тегов и ингредиентов.
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+# Версия множества id рецептов: меняется при создании и удалении рецептов.
+RECIPE_IDS_VERSION = 'recipe-ids'
+
+# Параметры запроса, от которых зависит ответ анонимному пользователю.
+RECIPE_LIST_PARAMS = (
+    'tags', 'author', 'page', 'limit', 'cursor', 'search'
+)
+
+
+def recipe_version(pk):
+    """Имя версии отдельного рецепта."""
+    return f'recipe:{pk}'
+
+
+def user_version(pk):
+    """Имя версии избранного, корзины и подписок пользователя."""
+    return f'user:{pk}'
+
+
+def shopping_list_version(pk):
+    """Имя версии списка покупок пользователя."""
+    return f'shopping-list:{pk}'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _modified_key(name):
+    return f'modified:{name}'
+
+
+def _new_version():
+    # Начальное значение зависит от времени, чтобы после вытеснения
+    # счётчика из кэша старые записи не совпали с новой версией.
+    return time.time_ns()
+
+
+def get_versions(*names):
+    """Возвращает текущие значения счётчиков версий."""
+    keys = [_version_key(name) for name in names]
+    return _get_or_add_many(keys, _new_version)
+
+
+def get_last_modified(*names):
+    """Возвращает время последнего изменения данных с версиями names."""
+    keys = [_modified_key(name) for name in names]
+    return datetime.fromtimestamp(
+        max(_get_or_add_many(keys, time.time)), tz=timezone.utc
+    )
+
+
+def _get_or_add_many(keys, default):
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            value = default()
+            if not cache.add(key, value, timeout=None):
+                value = cache.get(key, value)
+            values[key] = value
+    return [values[key] for key in keys]
+
+
+def _bump(names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+        cache.set(_modified_key(name), time.time(), timeout=None)
+
+
+def bump_versions(*names):
+    """Увеличивает счётчики версий после фиксации транзакции."""
+    transaction.on_commit(lambda: _bump(names))
+
+
+def build_cache_key(prefix, request, versions, params=()):
+    """
+    Ключ ответа: хост, путь, нормализованные параметры запроса
+    и версии данных, от которых зависит ответ.
+    """
+    query = urlencode(sorted(
+        (param, value)
+        for param in params
+        for value in set(request.query_params.getlist(param))
+    ))
+    raw = '|'.join((
+        request.build_absolute_uri(request.path),
+        query,
+        ':'.join(str(version) for version in get_versions(*versions)),
+    ))
+    return f'{prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def conditional_get(get_names, per_user=False):
+    """
+    Декоратор list/retrieve: ETag и Last-Modified по версиям данных,
+    на условные запросы отвечает 304 без обращения к сериализаторам.
+
+    get_names(**kwargs) возвращает имена версий, от которых зависит
+    ответ; при per_user=True к ним добавляется версия пользователя.
+    """
+    def names(request, kwargs):
+        names = list(get_names(**kwargs))
+        if per_user and request.user.is_authenticated:
+            names.append(user_version(request.user.pk))
+        return names
+
+    def etag(request, *args, **kwargs):
+        raw = '|'.join((
+            request.build_absolute_uri(),
+            str(request.user.pk) if per_user else '',
+            request.META.get('HTTP_ACCEPT', ''),
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            *(str(version) for version in get_versions(
+                *names(request, kwargs)
+            )),
+        ))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return get_last_modified(*names(request, kwargs))
+
+    return method_decorator(
+        condition(etag_func=etag, last_modified_func=last_modified)
+    )
+
+
+def recipe_cache_keys(request, pks):
+    """
+    Ключи общих (без флагов пользователя) представлений рецептов:
+    по одному на версию рецепта и версию справочных данных.
+    """
+    *versions, references = get_versions(
+        *(recipe_version(pk) for pk in pks), REFERENCES_VERSION
+    )
+    host = request.build_absolute_uri('/')
+    return {
+        pk: f'recipe:{pk}:{version}:{references}:{host}'
+        for pk, version in zip(pks, versions)
+    }
+
+
+def get_user_recipe_sets(user):
+    """
+    Множества id избранных рецептов, рецептов в корзине
+    и авторов в подписках пользователя, закэшированные по его версии.
+    """
+    version, = get_versions(user_version(user.pk))
+    key = f'user-recipe-sets:{user.pk}:{version}'
+    user_sets = cache.get(key)
+    if user_sets is None:
+        user_sets = {
+            'favorites': set(
+                user.favorites.values_list('recipe_id', flat=True)
+            ),
+            'shopping_cart': set(
+                user.shopping_cart.values_list('recipe_id', flat=True)
+            ),
+            'subscriptions': set(
+                user.follower.values_list('author_id', flat=True)
+            ),
+        }
+        cache.set(key, user_sets, settings.RECIPES_CACHE_TIMEOUT)
+    return user_sets
+
+
+def strip_user_fields(recipe):
+    """Сбрасывает в представлении рецепта флаги пользователя."""
+    return apply_user_fields(
+        recipe,
+        {'favorites': (), 'shopping_cart': (), 'subscriptions': ()}
+    )
+
+
+def apply_user_fields(recipe, user_sets):
+    """Проставляет в представлении рецепта флаги пользователя."""
+    return {
+        **recipe,
+        'author': {
+            **recipe['author'],
+            'is_subscribed': (
+                recipe['author']['id'] in user_sets['subscriptions']
+            ),
+        },
+        'is_favorited': recipe['id'] in user_sets['favorites'],
+        'is_in_shopping_cart': recipe['id'] in user_sets['shopping_cart'],
+    }
+
+
+def cached_response(key, get_response):
+    """
+    Отдаёт данные ответа из кэша либо вызывает get_response
+    и кэширует данные успешного ответа.
+    """
+    data = cache.get(key)
+    if data is not None:
+        return Response(data)
+    response = get_response()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.RECIPES_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Счётчики версий кэша меняют и процессы вне веб-сервера (воркеры
+    run_workers, load_ingredients, load_tags, import_recipes): с кэшем
+    в памяти процесса веб-сервер их не увидит и будет отдавать
+    устаревшие ответы.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кэш {backend} не общий для процессов: версии кэша, '
+        'изменённые воркерами и командами импорта, не будут видны.',
+        hint='Задайте CACHE_BACKEND, например '
+             'django.core.cache.backends.db.DatabaseCache, и выполните '
+             'python manage.py createcachetable.',
+        id='api.E001',
+    )]
+
+
+@register(deploy=True)
+def check_pdf_font(app_configs, **kwargs):
+    """
+    Список покупок в PDF рисуется шрифтом SHOPPING_LIST_PDF_FONT;
+    встроенного в Pillow шрифта без кириллицы для него недостаточно.
+    """
+    if os.path.isfile(settings.SHOPPING_LIST_PDF_FONT):
+        return []
+    return [Error(
+        f'Шрифт {settings.SHOPPING_LIST_PDF_FONT} для списка покупок '
+        'в PDF не найден.',
+        hint='Установите пакет fonts-dejavu-core или укажите путь '
+             'к TrueType-шрифту с кириллицей в SHOPPING_LIST_PDF_FONT.',
+        id='api.E002',
+    )]
@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from PIL import Image, ImageDraw, ImageFont
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+from api.cache import INGREDIENTS_VERSION, get_versions, shopping_list_version
+
+# Параметры страницы PDF (A4 при 150 dpi).
+PDF_PAGE_SIZE = (1240, 1754)
+PDF_MARGIN = 100
+PDF_FONT_SIZE = 32
+PDF_LINE_HEIGHT = 48
+
+
+def text_lines(rows):
+    separator = ''
+    for name, unit, amount in rows:
+        yield f'{separator}{name} {unit} — {amount}'
+        separator = '\n'
+
+
+class _Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_lines(rows):
+    yield '['
+    separator = ''
+    for name, unit, amount in rows:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']'
+
+
+def render_pdf(rows):
+    """Рисует список покупок постранично и собирает из страниц PDF."""
+    # Встроенный шрифт Pillow без кириллицы: без файла шрифта
+    # лучше ошибка, чем PDF из пустых прямоугольников.
+    font = ImageFont.truetype(settings.SHOPPING_LIST_PDF_FONT, PDF_FONT_SIZE)
+    lines = ['Список покупок', ''] + [
+        f'{name} {unit} — {amount}' for name, unit, amount in rows
+    ]
+    per_page = (PDF_PAGE_SIZE[1] - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT
+    pages = []
+    for start in range(0, len(lines), per_page):
+        page = Image.new('L', PDF_PAGE_SIZE, 255)
+        draw = ImageDraw.Draw(page)
+        for number, line in enumerate(lines[start:start + per_page]):
+            draw.text(
+                (PDF_MARGIN, PDF_MARGIN + number * PDF_LINE_HEIGHT),
+                line, font=font, fill=0
+            )
+        pages.append(page)
+    buffer = io.BytesIO()
+    pages[0].save(
+        buffer, 'PDF', resolution=150, save_all=True,
+        append_images=pages[1:]
+    )
+    return buffer.getvalue()
+
+
+# Формат: (MIME-тип, генератор строк; None — рендер в пуле процессов).
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', text_lines),
+    'csv': ('text/csv; charset=utf-8', csv_lines),
+    'json': ('application/json', json_lines),
+    'pdf': ('application/pdf', None),
+}
+
+
+class PdfTimeout(APIException):
+    """PDF не отрисован за SHOPPING_LIST_PDF_TIMEOUT секунд."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Список покупок в PDF не успел сформироваться.'
+    default_code = 'pdf_timeout'
+    # Заголовок Retry-After, как у Throttled.
+    wait = 5
+
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+_pdf_slots = None
+
+
+def _get_pdf_executor():
+    global _pdf_executor, _pdf_slots
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            workers = settings.SHOPPING_LIST_PDF_WORKERS
+            _pdf_executor = ProcessPoolExecutor(max_workers=workers)
+            # Не больше двух задач в очереди на каждый процесс пула.
+            _pdf_slots = threading.BoundedSemaphore(workers * 2)
+    return _pdf_executor
+
+
+def render_pdf_in_pool(rows):
+    """
+    Рендерит PDF в ограниченном пуле процессов; при переполнении
+    очереди отвечает 429, а не занимает воркер ожиданием, по истечении
+    SHOPPING_LIST_PDF_TIMEOUT — 503. Место в очереди освобождается,
+    когда задача завершится, а не когда перестали ждать её результат.
+    """
+    executor = _get_pdf_executor()
+    if not _pdf_slots.acquire(timeout=1):
+        raise Throttled(wait=5, detail='Слишком много запросов PDF.')
+    try:
+        future = executor.submit(render_pdf, rows)
+    except BaseException:
+        _pdf_slots.release()
+        raise
+    future.add_done_callback(lambda future: _pdf_slots.release())
+    try:
+        return future.result(timeout=settings.SHOPPING_LIST_PDF_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise PdfTimeout()
+
+
+def _cache_on_complete(chunks, key):
+    """Отдаёт части ответа и кэширует его целиком, если он дочитан."""
+    parts = []
+    for chunk in chunks:
+        chunk = chunk.encode()
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), settings.RECIPES_CACHE_TIMEOUT)
+
+
+def shopping_list_response(user, file_format):
+    """Ответ со списком покупок пользователя в формате file_format."""
+    content_type, render = SHOPPING_LIST_FORMATS[file_format]
+    # Названия и единицы берутся из ингредиентов: их изменение
+    # тоже делает сохранённый список устаревшим.
+    version, ingredients_version = get_versions(
+        shopping_list_version(user.pk), INGREDIENTS_VERSION
+    )
+    key = (
+        f'shopping-list:{user.pk}:{version}:{ingredients_version}:'
+        f'{file_format}'
+    )
+    content = cache.get(key)
+    rows = (
+        user.shopping_list
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        .order_by('ingredient__name')
+    )
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    elif render is None:
+        content = render_pdf_in_pool(list(rows))
+        cache.set(key, content, settings.RECIPES_CACHE_TIMEOUT)
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            _cache_on_complete(render(rows.iterator()), key),
+            content_type=content_type
+        )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"'
+    )
+    return response
@@ -1,25 +1,280 @@
 import base64
+import binascii
+import re
 import uuid
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, UnidentifiedImageError
 from rest_framework import serializers
 
+from api.models import ImageUpload
+
+DATA_URI_HEADER = re.compile(r'data:image/(?P<ext>[a-z]+);base64,')
+# Допустимые форматы: расширение из data URI -> формат Pillow.
+IMAGE_FORMATS = {
+    'png': 'PNG',
+    'jpeg': 'JPEG',
+    'jpg': 'JPEG',
+    'gif': 'GIF',
+    'webp': 'WEBP',
+}
+# Формат Pillow -> расширение сохраняемого файла.
+FORMAT_EXTENSIONS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+    'MPO': 'jpg',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+# Размер части Base64-строки, декодируемой за раз (кратен 4).
+CHUNK_SIZE = 64 * 1024
+# Префикс ссылки на файл, загруженный частями.
+UPLOAD_PREFIX = 'upload:'
+
+
+class UploadedImage(File):
+    """
+    Файл завершённой загрузки частями. Как у TemporaryUploadedFile,
+    у него есть temporary_file_path(): ImageField проверяет файл по
+    пути, а хранилище перемещает .part на место без копирования.
+    """
+
+    def __init__(self, file, name, upload):
+        super().__init__(file, name)
+        self.upload = upload
+        self.size = upload.size
+
+    def temporary_file_path(self):
+        return self.upload.path
+
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле, декодирующее Base64-строку."""
+    """
+    Кастомное поле, декодирующее Base64-строку.
+
+    Принимает также загруженный файл (multipart/form-data) и ссылку
+    «upload:<token>» на файл, загруженный частями через /api/uploads/.
+
+    Заголовок data URI и объявленный формат проверяются до декодирования.
+    Строка без пробельных символов декодируется частями во временный
+    файл на диске (TemporaryUploadedFile): ImageField проверяет его по
+    пути, не читая в память, а хранилище перемещает его на место без
+    копирования. Размеры изображения проверяются по первым
+    декодированным байтам, размер файла — по мере декодирования.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Некорректная Base64-строка изображения.',
+        'invalid_format': (
+            'Недопустимый формат изображения. Допустимые: {formats}.'
+        ),
+        'format_mismatch': 'Содержимое не соответствует формату {ext}.',
+        'too_large': 'Размер изображения превышает {max_bytes} байт.',
+        'too_many_pixels': (
+            'Размеры изображения превышают {max_side}×{max_side} пикселей.'
+        ),
+        'invalid_upload': 'Загрузка не найдена или не завершена.',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format_part, imgstr = data.split(';base64,')
-            ext = format_part.split('/')[-1]
-
-            try:
-                decoded_file = base64.b64decode(imgstr)
-            except TypeError:
-                raise serializers.ValidationError(
-                    'Некорректная Base64-строка изображения.'
+            data = self.decode_data_uri(data)
+        elif isinstance(data, str) and data.startswith(UPLOAD_PREFIX):
+            data = self.open_upload(data[len(UPLOAD_PREFIX):])
+        elif hasattr(data, 'size'):
+            self.check_size(data.size)
+            self.check_image_header(data)
+            data.seek(0)
+        return super().to_internal_value(data)
+
+    def check_size(self, size):
+        max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES
+        if size > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+
+    def open_upload(self, token):
+        """Открывает завершённую загрузку текущего пользователя."""
+        request = self.context.get('request')
+        try:
+            upload = ImageUpload.objects.get(token=token, user=request.user)
+        except (ImageUpload.DoesNotExist, ValidationError, AttributeError):
+            self.fail('invalid_upload')
+        if not upload.is_complete:
+            self.fail('invalid_upload')
+        try:
+            file = open(upload.path, 'rb')
+        except OSError:
+            self.fail('invalid_upload')
+        try:
+            image_format = self.check_image_header(file)
+            ext = FORMAT_EXTENSIONS.get(image_format)
+            if ext is None:
+                self.fail(
+                    'invalid_format', formats=', '.join(IMAGE_FORMATS)
                 )
-            file_uuid = uuid.uuid4()
-            data = ContentFile(decoded_file, name=f'{file_uuid}.{ext}')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return UploadedImage(file, f'{uuid.uuid4()}.{ext}', upload)
 
-        return super().to_internal_value(data)
+    def decode_data_uri(self, data):
+        header = DATA_URI_HEADER.match(data, 0, 64)
+        if header is None:
+            self.fail('invalid_base64')
+        ext = header['ext']
+        if ext not in IMAGE_FORMATS:
+            self.fail('invalid_format', formats=', '.join(IMAGE_FORMATS))
+
+        start = header.end()
+        file = TemporaryUploadedFile(
+            f'{uuid.uuid4()}.{ext}', f'image/{ext}', 0, None
+        )
+        rest = ''
+        try:
+            for offset in range(start, len(data), CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    data[offset:offset + CHUNK_SIZE].split()
+                )
+                # Переносы строк MIME отбрасываются; декодируется целое
+                # число четвёрок символов, остаток переходит дальше.
+                cut = len(chunk) - len(chunk) % 4
+                chunk, rest = chunk[:cut], chunk[cut:]
+                try:
+                    decoded = base64.b64decode(chunk, validate=True)
+                except (binascii.Error, ValueError):
+                    self.fail('invalid_base64')
+                first = not file.size
+                file.write(decoded)
+                file.size += len(decoded)
+                self.check_size(file.size)
+                if first and file.size:
+                    self.check_image_header(file, IMAGE_FORMATS[ext])
+                    file.seek(0, 2)
+            if rest or not file.size:
+                self.fail('invalid_base64')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return file
+
+    def check_image_header(self, file, image_format=None):
+        """
+        Проверяет формат и размеры по заголовку изображения и
+        возвращает формат. Если заголовок не читается (например,
+        не уместился в первую часть), возвращает None: проверку
+        выполнит ImageField по полному файлу.
+        """
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                actual_format, size = image.format, image.size
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            return None
+        if image_format and actual_format != image_format:
+            self.fail('format_mismatch', ext=image_format.lower())
+        max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+        if max(size) > max_side:
+            self.fail('too_many_pixels', max_side=max_side)
+        return actual_format
+
+
+class ImageFilesMixin:
+    """
+    Закрывает файлы Base64ImageField после сохранения объекта.
+    Временный файл, который хранилище переместило на место, иначе
+    закрывал бы только сборщик мусора. Использованная загрузка
+    частями удаляется вместе с .part-файлом; если сохранить объект
+    не удалось, она остаётся для повторной попытки.
+    """
+
+    def save(self, **kwargs):
+        files = [
+            value for value in self.validated_data.values()
+            if isinstance(value, File)
+        ]
+        try:
+            instance = super().save(**kwargs)
+        finally:
+            for file in files:
+                file.close()
+        for file in files:
+            if isinstance(file, UploadedImage):
+                file.upload.delete()
+        return instance
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """
+    Уменьшенные копии изображения по манифесту в формате
+    {"webp": "<url> 320w, <url> 640w", "jpg": "..."}; пока копии
+    не построены, возвращает пустой словарь.
+    """
+
+    def to_representation(self, manifest):
+        request = self.context.get('request')
+        srcset = {}
+        for extension, files in manifest.items():
+            if extension == 'source':
+                continue
+            urls = []
+            for width, name in sorted(
+                files.items(), key=lambda item: int(item[0])
+            ):
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(urls)
+        return srcset
+
+
+def resolve_pks(queryset, pks):
+    """
+    Возвращает объекты queryset в порядке pks одним запросом pk__in.
+    Все неизвестные и некорректные id перечисляются в одной ошибке.
+    """
+    ids = []
+    for pk in pks:
+        try:
+            ids.append(int(pk))
+        except (TypeError, ValueError):
+            ids.append(pk)
+    objects = queryset.in_bulk(
+        [pk for pk in ids if isinstance(pk, int)]
+    )
+    missing = list(dict.fromkeys(pk for pk in ids if pk not in objects))
+    if missing:
+        raise serializers.ValidationError(
+            'Объекты с id {} не существуют.'.format(
+                ', '.join(map(str, missing))
+            )
+        )
+    return [objects[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ManyRelatedField):
+    """
+    Список первичных ключей, который разрешается одним запросом
+    вместо запроса на каждый ключ, как у PrimaryKeyRelatedField(many=True).
+    """
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(
+            child_relation=serializers.PrimaryKeyRelatedField(
+                queryset=queryset
+            ),
+            **kwargs
+        )
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return resolve_pks(self.child_relation.get_queryset(), data)
@@ -0,0 +1,176 @@
+import io
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from api.cache import (RECIPES_VERSION, REFERENCES_VERSION, bump_versions,
+                       recipe_version)
+from jobs.queue import enqueue, job
+
+# Форматы уменьшенных копий: расширение -> формат Pillow и параметры.
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Значения EXIF Orientation, при которых ширина и высота меняются местами.
+TRANSPOSED_ORIENTATIONS = frozenset((5, 6, 7, 8))
+
+# Модель -> поле изображения, поле манифеста копий, настройка ширин
+# и функция версий кэша, которые нужно сбросить после генерации.
+DERIVATIVE_FIELDS = {
+    'recipes.Recipe': (
+        'image', 'image_derivatives', 'RECIPE_IMAGE_WIDTHS',
+        lambda pk: (RECIPES_VERSION, recipe_version(pk))
+    ),
+    'users.User': (
+        'avatar', 'avatar_derivatives', 'AVATAR_IMAGE_WIDTHS',
+        lambda pk: (RECIPES_VERSION, REFERENCES_VERSION)
+    ),
+}
+
+
+def get_widths(model):
+    """Ширины уменьшенных копий для изображений модели."""
+    return getattr(settings, DERIVATIVE_FIELDS[model._meta.label][2])
+
+
+def render_derivatives(content, widths):
+    """
+    Рендерит уменьшенные копии изображения в WebP и JPEG без EXIF.
+
+    Берутся ширины меньше исходной; если таких нет — копия в исходной
+    ширине. Возвращает {расширение: {ширина: байты}}. Функция не
+    обращается к БД и хранилищу, поэтому выполняется и в пуле процессов.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        targets = sorted(w for w in set(widths) if w < width) or [width]
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (targets[-1], targets[-1]))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    rendered = {extension: {} for extension in DERIVATIVE_FORMATS}
+    for target in targets:
+        resized = image.resize(
+            (target, max(1, round(image.height * target / image.width))),
+            Image.Resampling.LANCZOS
+        )
+        for extension, (image_format, options) in DERIVATIVE_FORMATS.items():
+            frame = resized
+            if image_format == 'JPEG' and has_alpha:
+                frame = Image.new('RGB', resized.size, 'white')
+                frame.paste(resized, mask=resized.getchannel('A'))
+            buffer = io.BytesIO()
+            frame.save(buffer, image_format, **options)
+            rendered[extension][target] = buffer.getvalue()
+    return rendered
+
+
+def derivative_name(source, width, extension):
+    """Имя копии рядом с оригиналом: <имя>_<ширина>w.<расширение>."""
+    stem, _ = os.path.splitext(source)
+    return f'{stem}_{width}w.{extension}'
+
+
+def manifest_names(manifest):
+    """Имена файлов, перечисленных в манифесте копий."""
+    return {
+        name
+        for extension, files in manifest.items() if extension != 'source'
+        for name in files.values()
+    }
+
+
+def needs_derivatives(instance):
+    """Манифест копий построен не для текущего изображения объекта."""
+    field, manifest_field, *_ = DERIVATIVE_FIELDS[instance._meta.label]
+    source = getattr(instance, field).name or None
+    return getattr(instance, manifest_field).get('source') != source
+
+
+def read_source(model, pk, force=False):
+    """
+    Возвращает (имя, содержимое) изображения объекта, если копии
+    для него ещё не построены или force=True, иначе None.
+    """
+    field, manifest_field, *_ = DERIVATIVE_FIELDS[model._meta.label]
+    instance = model.objects.only(field, manifest_field).filter(pk=pk).first()
+    if instance is None or not (force or needs_derivatives(instance)):
+        return None
+    source = getattr(instance, field).name or None
+    if source is None:
+        return source, None
+    with default_storage.open(source) as file:
+        return source, file.read()
+
+
+def store_derivatives(model, pk, source, rendered):
+    """
+    Сохраняет копии рядом с оригиналом и записывает манифест, если
+    изображение объекта за это время не сменилось. Файлы прежнего
+    манифеста удаляются, версии кэша сбрасываются.
+    """
+    field, manifest_field, _, versions = DERIVATIVE_FIELDS[model._meta.label]
+    manifest = {'source': source} if source else {}
+    for extension, files in (rendered or {}).items():
+        manifest[extension] = {}
+        for width, content in files.items():
+            name = derivative_name(source, width, extension)
+            default_storage.delete(name)
+            manifest[extension][str(width)] = default_storage.save(
+                name, ContentFile(content)
+            )
+
+    with transaction.atomic():
+        instance = (
+            model.objects.select_for_update().only(field, manifest_field)
+            .filter(pk=pk).first()
+        )
+        current = instance and (getattr(instance, field).name or None)
+        if instance is None or current != source:
+            stale = manifest_names(manifest)
+        else:
+            stale = (
+                manifest_names(getattr(instance, manifest_field))
+                - manifest_names(manifest)
+            )
+            model.objects.filter(pk=pk).update(**{manifest_field: manifest})
+            bump_versions(*versions(pk))
+    for name in stale:
+        default_storage.delete(name)
+
+
+def generate_derivatives(model, pk):
+    """Строит копии изображения объекта в текущем процессе."""
+    prepared = read_source(model, pk)
+    if prepared is None:
+        return
+    source, content = prepared
+    rendered = content and render_derivatives(content, get_widths(model))
+    store_derivatives(model, pk, source, rendered)
+
+
+@job('images.derivatives')
+def derivatives_job(label, pk):
+    generate_derivatives(apps.get_model(label), pk)
+
+
+def schedule_derivatives(instance):
+    """
+    Ставит генерацию копий в очередь фоновых задач. Задача пишется
+    в той же транзакции, что и изображение, и воркер не увидит её
+    раньше, чем изображение.
+    """
+    enqueue('images.derivatives', instance._meta.label, instance.pk)
@@ -0,0 +1,45 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class ImageUpload(models.Model):
+    """Изображение, загружаемое частями через /api/uploads/."""
+
+    token = models.UUIDField(
+        'Токен',
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    size = models.PositiveIntegerField('Размер файла')
+    offset = models.PositiveIntegerField('Загружено байт', default=0)
+    created_at = models.DateTimeField('Начало загрузки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self):
+        return f'{self.token} ({self.offset}/{self.size})'
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.token}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def delete(self, *args, **kwargs):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return super().delete(*args, **kwargs)
@@ -1,8 +1,50 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов: без COUNT и OFFSET."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionCursorPagination(RecipeCursorPagination):
+    """Курсорная пагинация списка подписок."""
+
+    ordering = ('-id',)
 
 
 class SubscriptionPagination(PageNumberPagination):
-    """Пагинация для списка подписок."""
+    """
+    Пагинация для списка подписок.
+
+    По умолчанию постраничная (limit/page). Если в запросе передан
+    параметр cursor (для первой страницы — пустой), включается
+    курсорный режим cursor_pagination_class.
+    """
 
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_pagination_class = SubscriptionCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(SubscriptionPagination):
+    """Пагинация ленты рецептов."""
+
+    cursor_pagination_class = RecipeCursorPagination
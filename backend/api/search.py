@@ -0,0 +1,171 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from api.cache import INGREDIENTS_VERSION, get_versions
+from ingredients.models import Ingredient
+from recipes.models import RecipeSearch
+
+# Длина n-грамм индекса подстрок.
+NGRAM = 3
+
+
+def normalize(text):
+    """Приводит строку к виду для поиска без учёта регистра и «ё»."""
+    return text.casefold().replace('ё', 'е')
+
+
+class IngredientSearchIndex:
+    """
+    Поисковый индекс ингредиентов в памяти процесса.
+
+    Префиксы ищутся двоичным поиском по отсортированным ключам,
+    подстроки — по индексу триграмм с проверкой вхождения.
+    Совпадения по префиксу идут раньше совпадений по подстроке,
+    внутри групп — по алфавиту.
+    """
+
+    def __init__(self, rows):
+        """rows — последовательность (id, name, measurement_unit)."""
+        self.entries = sorted(
+            rows, key=lambda row: (normalize(row[1]), row[0])
+        )
+        self.keys = [normalize(row[1]) for row in self.entries]
+        ngrams = defaultdict(lambda: array('I'))
+        for position, key in enumerate(self.keys):
+            for ngram in {
+                key[i:i + NGRAM] for i in range(len(key) - NGRAM + 1)
+            }:
+                ngrams[ngram].append(position)
+        self.ngrams = dict(ngrams)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _prefix_range(self, query):
+        start = bisect_left(self.keys, query)
+        return start, bisect_left(self.keys, query + '\U0010ffff', start)
+
+    def _substring_candidates(self, query):
+        if len(query) < NGRAM:
+            return range(len(self.keys))
+        postings = []
+        for i in range(len(query) - NGRAM + 1):
+            posting = self.ngrams.get(query[i:i + NGRAM])
+            if posting is None:
+                return ()
+            postings.append(posting)
+        return min(postings, key=len)
+
+    def search(self, query, limit=None):
+        """Возвращает до limit строк (id, name, measurement_unit)."""
+        query = normalize(query)
+        start, end = self._prefix_range(query)
+        positions = list(islice(range(start, end), limit))
+        if limit is None or len(positions) < limit:
+            substring_positions = (
+                position
+                for position in self._substring_candidates(query)
+                if not start <= position < end
+                and query in self.keys[position]
+            )
+            positions.extend(islice(
+                substring_positions,
+                None if limit is None else limit - len(positions)
+            ))
+        return [self.entries[position] for position in positions]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """
+    Индекс ингредиентов текущего процесса; перестраивается,
+    когда меняется версия таблицы ингредиентов.
+    """
+    global _index, _index_version
+    version, = get_versions(INGREDIENTS_VERSION)
+    if _index_version != version:
+        with _index_lock:
+            if _index_version != version:
+                _index = IngredientSearchIndex(
+                    Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit'
+                    )
+                )
+                _index_version = version
+    return _index
+
+
+# Слова поискового запроса для FTS5.
+WORD = re.compile(r'\w+')
+# Веса названия и описания рецепта при ранжировании в SQLite.
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def fts_query(query):
+    """
+    Запрос FTS5 из пользовательской строки: все слова обязательны
+    и ищутся по префиксу. У SQLite нет русской морфологии, поэтому
+    окончание длинных слов отбрасывается: «супы» найдёт «суп»,
+    «картошку» — «картошка».
+    """
+    terms = []
+    for word in WORD.findall(normalize(query)):
+        if len(word) >= 5:
+            word = word[:-2]
+        elif len(word) == 4:
+            word = word[:-1]
+        terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию.
+    Добавляет поле search_rank: чем больше, тем релевантнее.
+    """
+    quote_name = connection.ops.quote_name
+    if connection.vendor == 'postgresql':
+        # Импорт здесь: django.contrib.postgres требует psycopg.
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorField)
+
+        # Столбец search_vector создан миграцией recipes/0008 и
+        # не описан в модели.
+        vector = RawSQL(
+            f'{quote_name(queryset.model._meta.db_table)}.'
+            f'{quote_name("search_vector")}', (),
+            output_field=SearchVectorField()
+        )
+        search_query = SearchQuery(
+            query, config='russian', search_type='websearch'
+        )
+        return queryset.alias(search_vector=vector).filter(
+            search_vector=search_query
+        ).annotate(search_rank=SearchRank(vector, search_query))
+    match = fts_query(query)
+    if not match:
+        # В запросе нет слов: как и websearch_to_tsquery, ничего не ищем.
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    # Таблица FTS5 присоединяется по rowid (search_row__isnull=False),
+    # MATCH и bm25 обращаются к ней по имени: FTS5 не умеет быстро
+    # проверять MATCH для одного rowid в подзапросе.
+    fts = quote_name(RecipeSearch._meta.db_table)
+    return queryset.filter(search_row__isnull=False).filter(
+        RawSQL(f'{fts} MATCH %s', (match,), output_field=BooleanField())
+    ).annotate(search_rank=RawSQL(
+        f'-bm25({fts}, %s, %s)', FTS_WEIGHTS, output_field=FloatField()
+    ))
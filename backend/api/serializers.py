@@ -1,27 +1,57 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import QueryDict
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 
-from api.fields import Base64ImageField
+from api.cache import bump_versions, shopping_list_version
+from api.fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                        ImageFilesMixin, ImageSrcsetField, resolve_pks)
+from api.models import ImageUpload
 from ingredients.models import Ingredient
 from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from recipes.shopping_list import change_recipe_amounts
 from tags.models import Tag
 from users.models import Subscription
 
 User = get_user_model()
 
 
+class UpdateFieldsMixin:
+    """
+    Сохраняет при обновлении только переданные поля: счётчики,
+    которые сигналы меняют через F(), не перезаписываются значениями,
+    прочитанными до запроса. Поля many-to-many должны быть обработаны
+    до вызова update().
+    """
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     """Укороченная карточка рецепта (для списка подписок)."""
 
+    image_srcset = ImageSrcsetField(source='image_derivatives')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
-class UserAvatarSerializer(serializers.ModelSerializer):
+class UserAvatarSerializer(
+    ImageFilesMixin, UpdateFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор только для обновления аватарки."""
 
     avatar = Base64ImageField(required=True)
@@ -46,12 +76,13 @@ class UserReadSerializer(UserSerializer):
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_srcset = ImageSrcsetField(source='avatar_derivatives')
 
     class Meta:
         model = User
         fields = (
             'id', 'email', 'username', 'first_name',
-            'last_name', 'is_subscribed', 'avatar'
+            'last_name', 'is_subscribed', 'avatar', 'avatar_srcset'
         )
         read_only_fields = fields
 
@@ -61,6 +92,9 @@ class UserReadSerializer(UserSerializer):
             return False
         if request.user == obj:
             return False
+        # Аннотация из api.views.annotate_is_subscribed.
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return obj.following.filter(user=request.user).exists()
 
 
@@ -68,48 +102,101 @@ class SubscriptionSerializer(UserReadSerializer):
     """Сериализатор для раздела ПОДПИСКИ."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
+
+    max_recipes_limit = 100
 
     class Meta:
         model = User
         fields = (
             'id', 'email', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'avatar', 'recipes', 'recipes_count',
+            'is_subscribed', 'avatar', 'avatar_srcset', 'recipes',
+            'recipes_count',
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    @classmethod
+    def get_recipes_limit(cls, request):
+        """Проверяет параметр recipes_limit и ограничивает его сверху."""
+        limit = request.query_params.get('recipes_limit')
+        if not limit:
+            return cls.max_recipes_limit
+        if not limit.isdigit():
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть неотрицательным целым числом.'}
+            )
+        return min(int(limit), cls.max_recipes_limit)
+
+    @classmethod
+    def recipes_prefetch(cls, request):
+        """
+        Последние рецепты всех авторов страницы одним запросом:
+        срез в Prefetch Django выполняет через ROW_NUMBER() по автору.
+        """
+        return Prefetch(
+            'recipes',
+            queryset=Recipe.objects.only(
+                'id', 'name', 'image', 'image_derivatives', 'cooking_time',
+                'author'
+            ).order_by('-pub_date', '-id')[:cls.get_recipes_limit(request)],
+            to_attr='latest_recipes'
+        )
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except (ValueError, TypeError):
-                pass
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.order_by('-pub_date', '-id')[
+                :self.get_recipes_limit(request)
+            ]
         return RecipeMinifiedSerializer(
             recipes, many=True, context={'request': request}
         ).data
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class UserRelationSerializer(serializers.ModelSerializer):
+    """
+    Базовый сериализатор связи пользователя с рецептом или автором.
+
+    Обе стороны связи передаются в save(), а связь создаётся одним
+    INSERT: повтор отсекает уникальное ограничение БД, а не
+    предварительный SELECT, поэтому параллельные запросы получают 400.
+    Другие ошибки целостности (например, из обработчиков сигналов)
+    пробрасываются: повтором считается только уже существующая связь.
+    """
+
+    duplicate_message = ''
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            pair = {field: validated_data[field] for field in self.Meta.fields}
+            if not self.Meta.model.objects.filter(**pair).exists():
+                raise
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]}
+            )
+
+
+class SubscribeSerializer(UserRelationSerializer):
     """Сериализатор для создания подписки."""
 
+    duplicate_message = 'Вы уже подписаны на этого автора.'
+
     class Meta:
         model = Subscription
         fields = ('user', 'author')
+        read_only_fields = fields
 
-    def validate(self, data):
-        user = data['user']
-        author = data['author']
-
-        if user == author:
-            raise ValidationError('Нельзя подписаться на самого себя.')
-        if Subscription.objects.filter(user=user, author=author).exists():
-            raise ValidationError('Вы уже подписаны на этого автора.')
-        return data
+    def create(self, validated_data):
+        if validated_data['user'] == validated_data['author']:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться на самого себя.'
+                ]
+            })
+        return super().create(validated_data)
 
     def to_representation(self, instance):
         return SubscriptionSerializer(
@@ -118,6 +205,35 @@ class SubscribeSerializer(serializers.ModelSerializer):
         ).data
 
 
+class SubscribeManySerializer(serializers.Serializer):
+    """Список авторов для массовой подписки или отписки."""
+
+    authors = BulkPrimaryKeyRelatedField(queryset=User.objects.all())
+
+    def validate_authors(self, value):
+        request = self.context['request']
+        if request.method == 'POST' and request.user in value:
+            raise ValidationError('Нельзя подписаться на самого себя.')
+        return value
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Сериализатор загрузки изображения частями."""
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'size', 'offset')
+        read_only_fields = ('token', 'offset')
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise ValidationError(
+                f'Размер файла должен быть от 1 до '
+                f'{settings.IMAGE_UPLOAD_MAX_BYTES} байт.'
+            )
+        return value
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тегов."""
 
@@ -138,7 +254,8 @@ class IngredientSerializer(serializers.ModelSerializer):
 class IngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи ингредиентов."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Ингредиенты разрешаются одним запросом в RecipeSerializer.
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -168,16 +285,16 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(
+    ImageFilesMixin, UpdateFieldsMixin, serializers.ModelSerializer
+):
     """Сериализатор для создания и отображения рецептов."""
 
     author = UserReadSerializer(read_only=True)
     image = Base64ImageField(required=True)
+    image_srcset = ImageSrcsetField(source='image_derivatives')
 
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
 
     # Ингредиенты на вход
     ingredients = IngredientWriteSerializer(many=True, write_only=True)
@@ -192,14 +309,17 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'author', 'image', 'text',
+            'id', 'name', 'author', 'image', 'image_srcset', 'text',
             'tags', 'ingredients', 'read_ingredients',
             'cooking_time', 'is_favorited', 'is_in_shopping_cart'
         )
         read_only_fields = ('pub_date',)
 
     def to_internal_value(self, data):
-        data = data.copy()
+        if isinstance(data, QueryDict):
+            data = self.parse_form_data(data)
+        else:
+            data = data.copy()
 
         ingredients = data.get('ingredients')
         if isinstance(ingredients, dict):
@@ -207,6 +327,29 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return super().to_internal_value(data)
 
+    def parse_form_data(self, data):
+        """
+        Приводит multipart/form-data к виду JSON-запроса: tags —
+        повторяющиеся поля или JSON-массив, ingredients — JSON-строка.
+        """
+        parsed = {key: data.get(key) for key in data}
+        if 'tags' in data:
+            tags = data.getlist('tags')
+            if len(tags) == 1 and tags[0].startswith('['):
+                tags = self.parse_json_field('tags', tags[0])
+            parsed['tags'] = tags
+        if isinstance(parsed.get('ingredients'), str):
+            parsed['ingredients'] = self.parse_json_field(
+                'ingredients', parsed['ingredients']
+            )
+        return parsed
+
+    def parse_json_field(self, field_name, value):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            raise ValidationError({field_name: 'Некорректный JSON.'})
+
     def validate_ingredients(self, value):
         """Валидация поля ingredients."""
         if not value:
@@ -217,7 +360,11 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Ингредиенты в рецепте не могут повторяться.'
             )
-        return value
+        ingredients = resolve_pks(Ingredient.objects.all(), ingredient_ids)
+        return [
+            {**item, 'id': ingredient}
+            for item, ingredient in zip(value, ingredients)
+        ]
 
     def validate_tags(self, value):
         """Валидация поля tags."""
@@ -232,25 +379,37 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_favorited'):
+                return obj.is_favorited
             return obj.in_favorites.filter(user=request.user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'is_in_shopping_cart'):
+                return obj.is_in_shopping_cart
             return obj.in_shopping_cart.filter(user=request.user).exists()
         return False
 
     def to_representation(self, instance):
         """Формируем ответ для фронтенда."""
+        # После записи рецепта ингредиенты и теги читаются двумя
+        # запросами; в списках они уже предзагружены, и это no-op.
+        prefetch_related_objects(
+            [instance], 'tags', Prefetch(
+                'ingredient_amounts',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
         rep = super().to_representation(instance)
         rep['ingredients'] = rep.pop('read_ingredients')
         rep['tags'] = TagSerializer(instance.tags.all(), many=True).data
         return rep
 
     def add_ingredients(self, ingredients_data, recipe_instance):
-        recipe_instance.ingredient_amounts.all().delete()
-
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
                 recipe=recipe_instance,
@@ -277,36 +436,96 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к ingredients_data: новые строки
+        добавляются одним bulk_create, изменённые количества — одним
+        bulk_update, убранные удаляются одним DELETE; совпадающие строки
+        не трогаются. Возвращает {ingredient_id: (было, стало)} для
+        изменившихся ингредиентов, 0 — ингредиента в рецепте нет.
+        """
+        rows = {
+            row.ingredient_id: row for row in
+            IngredientInRecipe.objects.select_for_update().filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {pk: row.amount for pk, row in rows.items()}
+        new_amounts = {
+            item['id'].pk: item['amount'] for item in ingredients_data
+        }
+        changes = {
+            pk: (old_amounts.get(pk, 0), new_amounts.get(pk, 0))
+            for pk in old_amounts.keys() | new_amounts.keys()
+            if old_amounts.get(pk, 0) != new_amounts.get(pk, 0)
+        }
+
+        to_update = []
+        for pk, (old, new) in changes.items():
+            if old and new:
+                rows[pk].amount = new
+                to_update.append(rows[pk])
+        IngredientInRecipe.objects.bulk_update(to_update, ('amount',))
+        removed = [pk for pk, (_, new) in changes.items() if not new]
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        self.add_ingredients([
+            item for item in ingredients_data if item['id'].pk not in rows
+        ], recipe)
+        return changes
+
+    def update_tags(self, recipe, tags):
+        """
+        Добавляет и удаляет только отличающиеся теги рецепта.
+        Возвращает множества id добавленных и удалённых тегов.
+        """
+        current = set(recipe.tags.values_list('pk', flat=True))
+        new = {tag.pk for tag in tags}
+        added, removed = new - current, current - new
+        if removed:
+            recipe.tags.remove(*removed)
+        if added:
+            recipe.tags.add(*added)
+        return added, removed
+
     @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        Обновляет рецепт; что именно изменилось в составе и тегах,
+        сохраняется в self.changes для точечной инвалидации.
+        """
         data_for_creation = validated_data.copy()
+        self.changes = {}
 
         if 'tags' in data_for_creation:
-            tags_data = data_for_creation.pop('tags')
-            instance.tags.set(tags_data)
+            added, removed = self.update_tags(
+                instance, data_for_creation.pop('tags')
+            )
+            self.changes['tags'] = {'added': added, 'removed': removed}
 
         if 'ingredients' in data_for_creation:
-            ingredients_data = data_for_creation.pop('ingredients')
-            instance.ingredient_amounts.all().delete()
-            self.add_ingredients(ingredients_data, instance)
+            changes = self.update_ingredients(
+                instance, data_for_creation.pop('ingredients')
+            )
+            self.changes['ingredients'] = changes
+            if changes:
+                cart_users = change_recipe_amounts(instance, changes)
+                bump_versions(*map(shopping_list_version, cart_users))
 
         return super().update(instance, data_for_creation)
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(UserRelationSerializer):
     """Сериализатор для Избранного."""
 
+    duplicate_message = 'Рецепт уже добавлен в избранное.'
+
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
-
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-
-        if user.favorites.filter(user=user, recipe=recipe).exists():
-            raise ValidationError('Рецепт уже добавлен в избранное.')
-        return data
+        read_only_fields = fields
 
     def to_representation(self, instance):
         return RecipeMinifiedSerializer(
@@ -315,23 +534,48 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(UserRelationSerializer):
     """Сериализатор для добавления рецептов в корзину покупок."""
 
+    duplicate_message = 'Рецепт уже находится в корзине покупок.'
+
     class Meta:
         model = ShoppingCart
         fields = ('user', 'recipe')
-
-    def validate(self, data):
-        user = data['user']
-        recipe = data['recipe']
-
-        if user.shopping_cart.filter(user=user, recipe=recipe).exists():
-            raise ValidationError('Рецепт уже находится в корзине покупок.')
-        return data
+        read_only_fields = fields
 
     def to_representation(self, instance):
         return RecipeMinifiedSerializer(
             instance.recipe,
             context=self.context
         ).data
+
+
+class ShoppingCartManySerializer(serializers.Serializer):
+    """Список рецептов для массового добавления в корзину."""
+
+    recipes = BulkPrimaryKeyRelatedField(queryset=Recipe.objects.all())
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Вложенный запрос пакета: только чтение, только пути API."""
+
+    method = serializers.ChoiceField(('GET', 'HEAD'), default='GET')
+    url = serializers.CharField()
+
+    def validate_url(self, value):
+        if not value.startswith('/api/'):
+            raise ValidationError('Адрес должен начинаться с /api/.')
+        if value.startswith(reverse('batch')):
+            raise ValidationError('Вложенные пакетные запросы запрещены.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Пакет вложенных запросов, не более BATCH_MAX_REQUESTS."""
+
+    requests = serializers.ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_REQUESTS
+    )
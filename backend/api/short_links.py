@@ -0,0 +1,206 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.urls import reverse
+
+from api.cache import RECIPE_IDS_VERSION, get_versions
+from recipes.models import Recipe
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+BASE = len(ALPHABET)
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+# Наибольший id рецепта: предел BigAutoField и 8 байт в фильтре Блума.
+MAX_ID = 2 ** 63 - 1
+# Наименьшая ёмкость фильтра Блума.
+MIN_CAPACITY = 1024
+# Новые id дочитываются с запасом ниже известного максимума: на
+# PostgreSQL транзакция с меньшим id может зафиксироваться позже.
+SYNC_OVERLAP = 1000
+
+
+def valid_id(pk):
+    """id рецепта в допустимом диапазоне первичного ключа."""
+    return 0 < pk <= MAX_ID
+
+
+def encode(number):
+    """Код base62 неотрицательного числа."""
+    code = ''
+    while True:
+        number, digit = divmod(number, BASE)
+        code = ALPHABET[digit] + code
+        if not number:
+            return code
+
+
+def decode(code):
+    """Число из кода base62; ValueError для посторонних символов."""
+    number = 0
+    for char in code:
+        if char not in DIGITS:
+            raise ValueError(f'Недопустимый символ кода: {char!r}.')
+        number = number * BASE + DIGITS[char]
+    return number
+
+
+class Base62Converter:
+    """Конвертер URL: код base62 в пути, id рецепта во view и reverse()."""
+
+    regex = '[0-9a-zA-Z]{1,11}'
+
+    def to_python(self, value):
+        number = decode(value)
+        if not valid_id(number):
+            raise ValueError(f'Код {value} вне диапазона id рецептов.')
+        return number
+
+    def to_url(self, value):
+        return encode(int(value))
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для целых чисел: без ложноотрицательных ответов
+    и с долей ложноположительных около error_rate, пока в нём
+    не больше capacity чисел.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(
+            8,
+            math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, number):
+        # Двойное хеширование: k позиций из двух половин одного дайджеста.
+        digest = hashlib.blake2b(
+            number.to_bytes(8, 'little'), digest_size=16
+        ).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return (
+            (first + index * second) % self.size
+            for index in range(self.hashes)
+        )
+
+    def add(self, number):
+        for position in self._positions(number):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, number):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(number)
+        )
+
+
+class RecipeIds:
+    """
+    Проверка существования рецептов без обращения к БД: фильтр Блума
+    по всем id и ограниченный кэш точных ответов для id, которые фильтр
+    пропустил. В БД уходят только ложноположительные и ещё не
+    проверенные id.
+
+    Когда меняется версия RECIPE_IDS_VERSION, новые id дочитываются
+    одним запросом по первичному ключу и добавляются в фильтр, а кэш
+    точных ответов сбрасывается: в нём могут быть удалённые рецепты.
+    Целиком фильтр строится только при первом обращении и когда число
+    id превышает его ёмкость (она удваивается). Пока один поток
+    обновляет фильтр, остальные не ждут его и проверяют отсутствующие
+    в фильтре id по БД.
+    """
+
+    def __init__(self):
+        self.filter = None
+        self.count = 0
+        self.max_pk = 0
+        self.version = None
+        self.known = OrderedDict()
+        self.known_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Обновляет множество до текущей версии. False — множество
+        устарело и его обновляет другой поток.
+        """
+        version, = get_versions(RECIPE_IDS_VERSION)
+        if self.version == version:
+            return True
+        if not self.update_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.version != version:
+                self.update()
+                self.version = version
+        finally:
+            self.update_lock.release()
+        return True
+
+    def update(self):
+        recipes = Recipe.objects.order_by().values_list('pk', flat=True)
+        if self.filter is None or self.count > self.filter.capacity:
+            pks = list(recipes.iterator())
+            bloom = BloomFilter(
+                max(2 * len(pks), MIN_CAPACITY),
+                settings.SHORT_LINK_FILTER_ERROR_RATE
+            )
+            self.count = len(pks)
+        else:
+            bloom = self.filter
+            pks = list(recipes.filter(pk__gt=self.max_pk - SYNC_OVERLAP))
+            self.count += sum(pk > self.max_pk for pk in pks)
+        for pk in pks:
+            bloom.add(pk)
+        self.filter = bloom
+        self.max_pk = max(pks, default=self.max_pk)
+        with self.known_lock:
+            self.known.clear()
+
+    def __contains__(self, pk):
+        if not valid_id(pk):
+            return False
+        current = self.refresh()
+        bloom = self.filter
+        if bloom is not None and pk not in bloom:
+            if current:
+                return False
+            return Recipe.objects.filter(pk=pk).exists()
+        with self.known_lock:
+            exists = self.known.get(pk)
+            if exists is not None:
+                self.known.move_to_end(pk)
+                return exists
+        exists = Recipe.objects.filter(pk=pk).exists()
+        with self.known_lock:
+            self.known[pk] = exists
+            if len(self.known) > settings.SHORT_LINK_CACHE_SIZE:
+                self.known.popitem(last=False)
+        return exists
+
+
+_recipe_ids = RecipeIds()
+# Начало короткой ссылки для каждой схемы и хоста.
+_prefixes = {}
+
+
+def get_recipe_ids():
+    """Множество id рецептов текущего процесса."""
+    return _recipe_ids
+
+
+def short_link(request, pk):
+    """Абсолютная короткая ссылка на рецепт."""
+    key = (request.scheme, request.get_host())
+    prefix = _prefixes.get(key)
+    if prefix is None:
+        prefix = _prefixes[key] = request.build_absolute_uri(
+            reverse('recipe_short_link', args=(0,))
+        )[:-len(encode(0)) - 1]
+    return f'{prefix}{encode(pk)}/'
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (INGREDIENTS_VERSION, RECIPE_IDS_VERSION,
+                       RECIPES_VERSION, REFERENCES_VERSION, TAGS_VERSION,
+                       bump_versions, recipe_version, shopping_list_version,
+                       user_version)
+from api.images import needs_derivatives, schedule_derivatives
+from ingredients.models import Ingredient
+from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from tags.models import Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+# Поля пользователя, которые попадают в ответы API.
+USER_PUBLIC_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar')
+)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def image_changed(sender, instance, **kwargs):
+    if needs_derivatives(instance):
+        schedule_derivatives(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, created=True, **kwargs):
+    bump_versions(RECIPES_VERSION, recipe_version(instance.pk))
+    if created:
+        bump_versions(RECIPE_IDS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_versions(RECIPES_VERSION, recipe_version(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_versions(RECIPES_VERSION, recipe_version(instance.pk))
+    elif pk_set:
+        bump_versions(
+            RECIPES_VERSION, *(recipe_version(pk) for pk in pk_set)
+        )
+    else:
+        bump_versions(RECIPES_VERSION, REFERENCES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    bump_versions(RECIPES_VERSION, REFERENCES_VERSION, TAGS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_versions(RECIPES_VERSION, REFERENCES_VERSION, INGREDIENTS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and USER_PUBLIC_FIELDS.isdisjoint(update_fields):
+        return
+    bump_versions(RECIPES_VERSION, REFERENCES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Subscription)
+def user_recipe_sets_changed(sender, instance, **kwargs):
+    bump_versions(user_version(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    bump_versions(
+        user_version(instance.user_id),
+        shopping_list_version(instance.user_id)
+    )
@@ -0,0 +1,94 @@
+import gzip
+import os
+import re
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import INGREDIENTS_VERSION, TAGS_VERSION, get_versions
+from api.serializers import IngredientSerializer, TagSerializer
+from ingredients.models import Ingredient
+from tags.models import Tag
+
+# Каталог: (версия таблицы, модель, сериализатор).
+CATALOGS = {
+    'tags': (TAGS_VERSION, Tag, TagSerializer),
+    'ingredients': (INGREDIENTS_VERSION, Ingredient, IngredientSerializer),
+}
+
+# Поддерживаемые кодировки в порядке предпочтения и расширения файлов.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'), ('identity', ''))
+
+
+def build_catalog_snapshot(name):
+    """Сериализует каталог целиком и сжимает результат."""
+    _, model, serializer_class = CATALOGS[name]
+    content = JSONRenderer().render(
+        serializer_class(model.objects.all(), many=True).data
+    )
+    return {
+        'identity': content,
+        'gzip': gzip.compress(content, compresslevel=9, mtime=0),
+        'br': brotli.compress(content),
+    }
+
+
+def write_catalog_snapshot(name, snapshot):
+    """Записывает снимок в CATALOG_SNAPSHOT_DIR для раздачи через nginx."""
+    directory = settings.CATALOG_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    for encoding, extension in ENCODINGS:
+        path = os.path.join(directory, f'{name}.json{extension}')
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(snapshot[encoding])
+        os.replace(temporary_path, path)
+
+
+def get_catalog_snapshot(name):
+    """
+    Снимок каталога для текущей версии таблицы: собирается один раз
+    на версию и хранится в кэше, общем для всех процессов.
+    """
+    version, = get_versions(CATALOGS[name][0])
+    key = f'catalog:{name}:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_catalog_snapshot(name)
+        cache.set(key, snapshot, timeout=None)
+        if settings.CATALOG_SNAPSHOT_DIR:
+            write_catalog_snapshot(name, snapshot)
+    return snapshot
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, разрешённые клиентом (q > 0)."""
+    encodings = set()
+    for part in header.split(','):
+        match = re.fullmatch(
+            r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*', part
+        )
+        if match and float(match.group(2) or 1) > 0:
+            encodings.add(match.group(1).lower())
+    return encodings
+
+
+def catalog_response(request, name):
+    """Ответ со снимком каталога в лучшей из принятых клиентом кодировок."""
+    snapshot = get_catalog_snapshot(name)
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = next(
+        encoding for encoding, _ in ENCODINGS
+        if encoding in accepted or '*' in accepted or encoding == 'identity'
+    )
+    response = HttpResponse(
+        snapshot[encoding], content_type='application/json'
+    )
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,1628 @@
+import base64
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import brotli
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import INGREDIENTS_VERSION, bump_versions
+from api.checks import check_pdf_font, check_shared_cache
+from api.exports import render_pdf
+from api.fields import Base64ImageField
+from api.images import (generate_derivatives, manifest_names,
+                        needs_derivatives, render_derivatives)
+from api.models import ImageUpload
+from api.search import IngredientSearchIndex, get_ingredient_index
+from api.serializers import (FavoriteSerializer, SubscriptionSerializer,
+                             UserAvatarSerializer)
+from ingredients.models import Ingredient
+from jobs.models import Job
+from jobs.queue import claim, enqueue, job, requeue_stale, retry_delay, run_job
+from recipes.models import (Favorite, IngredientInRecipe, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from recipes.search_index import restore_search_triggers
+from recipes.shopping_list import actual_shopping_lists
+from tags.models import Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_data_uri(size=(2, 2)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class APITestCase(TestCase):
+    """Пользователь с клиентом, теги и ингредиенты для тестов API."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@example.org', username='cook',
+            first_name='Иван', last_name='Поваров', password='pw-12345678'
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(50)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def use_temporary_media_root(self):
+        """Отдельная папка MEDIA_ROOT для тестов, пишущих файлы."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+            recipe.tags.set(self.tags[:2])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in self.ingredients[:3]
+            )
+
+
+class RecipeQueryCountTests(APITestCase):
+    """Число запросов к БД не зависит от размера страницы и рецепта."""
+
+    # Ответ без кэша анонимному пользователю: COUNT, рецепты, авторы,
+    # теги, количества ингредиентов и сами ингредиенты.
+    ANONYMOUS_LIST_QUERIES = 6
+    # Авторизованному дополнительно: выборка id страницы и множества
+    # избранного, корзины и подписок.
+    LIST_QUERIES = 10
+    DETAIL_QUERIES = 8
+    # Создание рецепта с 50 ингредиентами: проверка id ингредиентов
+    # и тегов, INSERT рецепта, тегов и ингредиентов, счётчики, задача
+    # уменьшенных копий и чтение ответа.
+    CREATE_QUERIES = 16
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        self.create_recipes(12)
+        for limit in (6, 12):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(self.LIST_QUERIES):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit}
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list_query_count_does_not_depend_on_page_size(self):
+        self.create_recipes(12)
+        client = APIClient()
+        for limit in (6, 12):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(self.ANONYMOUS_LIST_QUERIES):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail_query_count(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        with self.assertNumQueries(self.DETAIL_QUERIES):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_create_with_50_ingredients_query_count(self):
+        data = {
+            'name': 'Большой рецепт',
+            'text': 'Описание',
+            'cooking_time': 30,
+            'image': image_data_uri(),
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 2}
+                for ingredient in self.ingredients
+            ],
+        }
+        with self.assertNumQueries(self.CREATE_QUERIES):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['ingredients']), 50)
+        self.assertEqual(
+            IngredientInRecipe.objects.filter(
+                recipe_id=response.data['id']
+            ).count(),
+            50
+        )
+
+
+class RecipeTagFilterTests(APITestCase):
+    """Фильтр рецептов по нескольким тегам."""
+
+    def test_multiple_tags_give_distinct_recipes(self):
+        self.create_recipes(3)
+        other = Recipe.objects.create(
+            author=self.user, name='Другой рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        other.tags.set(self.tags[2:])
+        Recipe.objects.create(
+            author=self.user, name='Без тегов', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+        with self.assertNumQueries(RecipeQueryCountTests.LIST_QUERIES):
+            response = self.client.get(
+                '/api/recipes/', {'tags': ['tag0', 'tag1', 'tag2']}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(
+            ids, Recipe.objects.exclude(name='Без тегов')
+            .values_list('pk', flat=True)
+        )
+        response = self.client.get('/api/recipes/', {'tags': ['tag1', 'x']})
+        self.assertEqual(response.data['count'], 3)
+
+
+class RecipePaginationTests(APITestCase):
+    """Постраничная и курсорная пагинация ленты рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(10)
+        now = timezone.now()
+        for recipe in Recipe.objects.all():
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(minutes=recipe.pk)
+            )
+        self.expected = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('pk', flat=True)
+        )
+
+    def walk(self, on_page=None):
+        ids = []
+        response = self.client.get('/api/recipes/', {'cursor': '', 'limit': 4})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            if on_page is not None:
+                on_page()
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walk(self):
+        self.assertEqual(self.walk(), self.expected)
+
+    def test_cursor_walk_is_stable_after_insert(self):
+        def insert():
+            if Recipe.objects.count() > 10:
+                return
+            with self.captureOnCommitCallbacks(execute=True):
+                Recipe.objects.create(
+                    author=self.user, name='Новый рецепт', text='Описание',
+                    cooking_time=10, image='recipes/images/test.png'
+                )
+
+        self.assertEqual(self.walk(on_page=insert), self.expected)
+
+    def test_page_and_limit(self):
+        response = self.client.get('/api/recipes/', {'page': 2, 'limit': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            self.expected[4:8]
+        )
+        self.assertIn('page=3', response.data['next'])
+        self.assertIn('limit=4', response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        response = self.client.get('/api/recipes/', {'page': 4, 'limit': 4})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeCacheTests(APITestCase):
+    """Кэш рецептов, флаги пользователя поверх него и условные GET."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(2)
+        self.recipe = Recipe.objects.order_by('pk').first()
+        self.detail_url = f'/api/recipes/{self.recipe.pk}/'
+        self.reader = User.objects.create(
+            email='reader@example.org', username='reader'
+        )
+        self.other = User.objects.create(
+            email='other@example.org', username='other'
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def flags(self, user):
+        client = self.client_for(user)
+        recipes = [client.get(self.detail_url).data] + [
+            recipe for recipe in client.get('/api/recipes/').data['results']
+            if recipe['id'] == self.recipe.pk
+        ]
+        return [
+            (recipe['is_favorited'], recipe['is_in_shopping_cart'],
+             recipe['author']['is_subscribed'])
+            for recipe in recipes
+        ]
+
+    def test_anonymous_responses_invalidated_by_patch_and_delete(self):
+        anonymous = APIClient()
+        self.assertEqual(
+            anonymous.get(self.detail_url).data['name'], 'Рецепт 0'
+        )
+        anonymous.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.detail_url, {'name': 'Новое имя'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            anonymous.get(self.detail_url).data['name'], 'Новое имя'
+        )
+        self.assertIn(
+            'Новое имя',
+            [recipe['name'] for recipe
+             in anonymous.get('/api/recipes/').data['results']]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.detail_url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(anonymous.get(self.detail_url).status_code, 404)
+        response = anonymous.get('/api/recipes/')
+        self.assertEqual(response.data['count'], 1)
+        self.assertNotIn(
+            self.recipe.pk,
+            [recipe['id'] for recipe in response.data['results']]
+        )
+
+    def test_user_flags_do_not_leak(self):
+        self.assertEqual(self.flags(self.other), [(False, False, False)] * 2)
+        reader = self.client_for(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            reader.post(f'{self.detail_url}favorite/')
+            reader.post(f'{self.detail_url}shopping_cart/')
+            reader.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(self.flags(self.reader), [(True, True, True)] * 2)
+        self.assertEqual(self.flags(self.other), [(False, False, False)] * 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            reader.delete(f'{self.detail_url}favorite/')
+        self.assertEqual(self.flags(self.reader), [(False, True, True)] * 2)
+
+    def test_if_none_match(self):
+        reader = self.client_for(self.reader)
+        for url in (self.detail_url, '/api/recipes/'):
+            with self.subTest(url=url):
+                etag = reader.get(url)['ETag']
+                response = reader.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.client_for(self.other).get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                with self.captureOnCommitCallbacks(execute=True):
+                    reader.post(f'{self.detail_url}favorite/')
+                response = reader.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                with self.captureOnCommitCallbacks(execute=True):
+                    reader.delete(f'{self.detail_url}favorite/')
+
+
+class ShortLinkTests(APITestCase):
+    """Короткие ссылки на рецепты."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(70)
+        self.recipe = Recipe.objects.order_by('pk').last()
+
+    def test_get_link_redirects_to_recipe(self):
+        link = self.client.get(
+            f'/api/recipes/{self.recipe.pk}/get-link/'
+        ).data['short-link']
+        self.assertIn('/r/', link)
+        response = self.client.get(link)
+        self.assertRedirects(
+            response, f'/recipes/{self.recipe.pk}/',
+            fetch_redirect_response=False
+        )
+
+    def test_legacy_decimal_link_redirects_to_same_recipe(self):
+        response = self.client.get(f'/s/{self.recipe.pk}/')
+        self.assertRedirects(
+            response, f'/recipes/{self.recipe.pk}/',
+            fetch_redirect_response=False
+        )
+
+    def test_unknown_recipe(self):
+        self.assertEqual(self.client.get('/s/100000/').status_code, 404)
+        self.assertEqual(self.client.get('/r/zzz/').status_code, 404)
+
+    def test_out_of_range_ids(self):
+        for url in (
+            '/r/ZZZZZZZZZZZ/', '/s/99999999999999999999/',
+            '/api/recipes/-1/get-link/',
+            '/api/recipes/99999999999999999999/get-link/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_new_and_deleted_recipes_without_full_rebuild(self):
+        self.assertEqual(
+            self.client.get(f'/s/{self.recipe.pk}/').status_code, 302
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Новый', text='Описание',
+                cooking_time=10, image='recipes/images/test.png'
+            )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/s/{recipe.pk}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(all(
+            'WHERE' in query['sql'] for query in context.captured_queries
+        ))
+        recipe_pk = recipe.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(self.client.get(f'/s/{recipe_pk}/').status_code, 404)
+
+
+class Base64ImageFieldTests(TestCase):
+    """Разбор изображения из Base64."""
+
+    def test_decodes_to_temporary_file(self):
+        file = Base64ImageField().to_internal_value(image_data_uri())
+        self.addCleanup(file.close)
+        self.assertTrue(file.name.endswith('.png'))
+        with Image.open(file.temporary_file_path()) as image:
+            self.assertEqual(image.size, (2, 2))
+
+    def test_accepts_line_wrapped_base64(self):
+        header, payload = image_data_uri((50, 50)).split(',')
+        wrapped = '\r\n'.join(
+            payload[start:start + 76] for start in range(0, len(payload), 76)
+        )
+        file = Base64ImageField().to_internal_value(f'{header},{wrapped}\n')
+        self.addCleanup(file.close)
+        with Image.open(file) as image:
+            self.assertEqual(image.size, (50, 50))
+
+    def test_rejects_invalid_base64(self):
+        for data in (
+            'data:image/png;base64,', 'data:image/png;base64,iVBOR!',
+            image_data_uri()[:-1],
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(serializers.ValidationError):
+                    Base64ImageField().to_internal_value(data)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=50)
+    def test_rejects_large_image(self):
+        with self.assertRaises(serializers.ValidationError) as context:
+            Base64ImageField().to_internal_value(image_data_uri((50, 50)))
+        self.assertEqual(context.exception.detail[0].code, 'too_large')
+
+
+class UserRelationTests(APITestCase):
+    """Повторное добавление связи пользователя с рецептом."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(1)
+        self.recipe = Recipe.objects.get()
+
+    def test_duplicate_favorite(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['non_field_errors'],
+            [FavoriteSerializer.duplicate_message]
+        )
+
+    def test_other_integrity_errors_are_not_duplicates(self):
+        def fail(**kwargs):
+            raise IntegrityError('signal handler')
+
+        post_save.connect(fail, sender=Favorite)
+        self.addCleanup(post_save.disconnect, fail, sender=Favorite)
+        serializer = FavoriteSerializer(data={})
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaisesMessage(IntegrityError, 'signal handler'):
+            serializer.save(user=self.user, recipe=self.recipe)
+        self.assertFalse(Favorite.objects.exists())
+
+
+class RecipePatchTests(APITestCase):
+    """PATCH рецепта меняет только отличающиеся строки состава и тегов."""
+
+    # Рецепт с автором, тегами и составом, проверка id ингредиентов
+    # и тегов, текущие теги, блокировка состава, по одному UPDATE,
+    # SELECT + DELETE и INSERT строк состава, корзины с рецептом,
+    # четыре точки сохранения и теги с составом для ответа.
+    PATCH_QUERIES = 20
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(1)
+        self.recipe = Recipe.objects.get()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def rows(self):
+        return {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount
+            in IngredientInRecipe.objects.filter(recipe=self.recipe)
+            .values_list('pk', 'ingredient_id', 'amount')
+        }
+
+    def patch(self, ingredients):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {
+                'ingredients': [
+                    {'id': self.ingredients[number].pk, 'amount': amount}
+                    for number, amount in ingredients
+                ],
+                'tags': [tag.pk for tag in self.tags[:2]],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        table = IngredientInRecipe._meta.db_table
+        writes = sorted(
+            query['sql'].split()[0] for query in queries.captured_queries
+            if table in query['sql']
+            and not query['sql'].startswith('SELECT')
+        )
+        return len(queries), writes
+
+    def test_only_changed_rows_are_written(self):
+        before = self.rows()
+        ingredients = [ingredient.pk for ingredient in self.ingredients]
+        count, writes = self.patch([(0, 1), (1, 5), (3, 2)])
+        self.assertEqual(count, self.PATCH_QUERIES)
+        self.assertEqual(writes, ['DELETE', 'INSERT', 'UPDATE'])
+        after = self.rows()
+        self.assertEqual(
+            {pk: amount for pk, (_, amount) in after.items()},
+            {ingredients[0]: 1, ingredients[1]: 5, ingredients[3]: 2}
+        )
+        self.assertEqual(after[ingredients[0]], before[ingredients[0]])
+        self.assertEqual(after[ingredients[1]][0], before[ingredients[1]][0])
+        self.assertFalse(set(self.recipe.tags.values_list('pk', flat=True))
+                         ^ {tag.pk for tag in self.tags[:2]})
+
+    def test_unchanged_ingredients_are_not_written(self):
+        before = self.rows()
+        _, writes = self.patch([(0, 1), (1, 1), (2, 1)])
+        self.assertEqual(writes, [])
+        self.assertEqual(self.rows(), before)
+
+
+class ShoppingListConsistencyTests(APITestCase):
+    """Список покупок, обновляемый по изменениям, и пересчёт с нуля."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(3)
+        self.recipes = list(Recipe.objects.order_by('pk'))
+        self.reader = User.objects.create(
+            email='reader@example.org', username='reader'
+        )
+        for user in (self.user, self.reader):
+            for recipe in self.recipes[:2]:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipes[2])
+
+    def stored(self):
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+
+    def assertConsistent(self):
+        self.assertEqual(
+            self.stored(),
+            actual_shopping_lists([self.user.pk, self.reader.pk])
+        )
+
+    def test_recipe_ingredients_update(self):
+        self.assertConsistent()
+        ingredients = self.ingredients
+        response = self.client.patch(
+            f'/api/recipes/{self.recipes[0].pk}/',
+            {'ingredients': [
+                {'id': ingredients[0].pk, 'amount': 10},
+                {'id': ingredients[1].pk, 'amount': 1},
+                {'id': ingredients[5].pk, 'amount': 4},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertConsistent()
+        stored = self.stored()
+        self.assertEqual(stored[(self.user.pk, ingredients[0].pk)], 12)
+        self.assertEqual(stored[(self.user.pk, ingredients[2].pk)], 2)
+        self.assertEqual(stored[(self.reader.pk, ingredients[5].pk)], 4)
+
+    def test_recipe_delete(self):
+        response = self.client.delete(f'/api/recipes/{self.recipes[1].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertConsistent()
+        self.assertEqual(
+            self.stored()[(self.reader.pk, self.ingredients[0].pk)], 4
+        )
+
+    def test_cart_removal(self):
+        response = self.client.delete(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertConsistent()
+        self.client.delete(f'/api/recipes/{self.recipes[1].pk}/shopping_cart/')
+        self.assertConsistent()
+        self.assertFalse(self.user.shopping_list.exists())
+
+    def test_rebuild_repairs_drift(self):
+        ShoppingListItem.objects.filter(
+            user=self.user, ingredient=self.ingredients[0]
+        ).update(amount=100)
+        ShoppingListItem.objects.filter(
+            user=self.reader, ingredient=self.ingredients[1]
+        ).delete()
+        ShoppingListItem.objects.create(
+            user=self.user, ingredient=self.ingredients[9], amount=5
+        )
+        out = io.StringIO()
+        call_command('rebuild_shopping_lists', '--check', stdout=out)
+        self.assertIn('расхождениями: 2', out.getvalue())
+        call_command(
+            'rebuild_shopping_lists', batch_size=1, stdout=io.StringIO()
+        )
+        self.assertConsistent()
+        out = io.StringIO()
+        call_command('rebuild_shopping_lists', '--check', stdout=out)
+        self.assertIn('расхождениями: 0', out.getvalue())
+
+
+class SubscriptionListTests(APITestCase):
+    """Список подписок с последними рецептами и флаг is_subscribed."""
+
+    # Подписки: COUNT, авторы страницы и их последние рецепты.
+    SUBSCRIPTIONS_QUERIES = 3
+    # Пользователи: COUNT и пользователи с подзапросом is_subscribed.
+    USERS_QUERIES = 2
+
+    def setUp(self):
+        super().setUp()
+        self.authors = User.objects.bulk_create(
+            User(email=f'author{number}@example.org',
+                 username=f'author{number}')
+            for number in range(4)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {author.username} {number}',
+                text='Описание', cooking_time=10,
+                image='recipes/images/test.png'
+            )
+            for author in self.authors for number in range(3)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=self.user, author=author)
+            for author in self.authors[:3]
+        )
+
+    def subscriptions(self, **params):
+        return self.client.get('/api/users/subscriptions/', params)
+
+    def test_recipes_limit(self):
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(self.SUBSCRIPTIONS_QUERIES):
+                    response = self.subscriptions(
+                        limit=limit, recipes_limit=2
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+                for author in response.data['results']:
+                    self.assertTrue(author['is_subscribed'])
+                    self.assertEqual(
+                        [recipe['name'] for recipe in author['recipes']],
+                        [f'Рецепт {author["username"]} {number}'
+                         for number in (2, 1)]
+                    )
+        response = self.subscriptions(recipes_limit=0)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [author['recipes'] for author in response.data['results']],
+            [[], [], []]
+        )
+
+    def test_recipes_limit_is_capped(self):
+        limit = SubscriptionSerializer.max_recipes_limit
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.authors[0], name=f'Ещё рецепт {number}',
+                text='Описание', cooking_time=10,
+                image='recipes/images/test.png'
+            )
+            for number in range(limit)
+        )
+        response = self.subscriptions(recipes_limit=limit * 10)
+        self.assertEqual(response.status_code, 200)
+        recipes = {
+            author['id']: len(author['recipes'])
+            for author in response.data['results']
+        }
+        self.assertEqual(recipes[self.authors[0].pk], limit)
+        self.assertEqual(recipes[self.authors[1].pk], 3)
+
+    def test_invalid_recipes_limit(self):
+        for value in ('abc', '-1', '2.5'):
+            with self.subTest(value=value):
+                response = self.subscriptions(recipes_limit=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+
+    def test_users_is_subscribed_is_batched(self):
+        # Обычному пользователю djoser показывает в списке только его.
+        self.user.is_staff = True
+        for limit in (2, 5):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(self.USERS_QUERIES):
+                    response = self.client.get('/api/users/', {'limit': limit})
+                self.assertEqual(len(response.data['results']), limit)
+        response = self.client.get('/api/users/', {'limit': 10})
+        subscribed = {
+            user['id']: user['is_subscribed']
+            for user in response.data['results']
+        }
+        self.assertEqual(subscribed, {
+            self.user.pk: False,
+            **{author.pk: True for author in self.authors[:3]},
+            self.authors[3].pk: False,
+        })
+
+
+class ShoppingCartBulkTests(APITestCase):
+    """Массовое добавление в корзину и её очистка."""
+
+    def test_add_and_clear(self):
+        self.create_recipes(2)
+        recipes = list(Recipe.objects.order_by('pk'))
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.pk for recipe in recipes]}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            dict(ShoppingListItem.objects.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {ingredient.pk: 3 for ingredient in self.ingredients[:3]}
+        )
+        self.assertEqual(
+            self.client.delete('/api/recipes/shopping_cart/').status_code, 204
+        )
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(ShoppingListItem.objects.exists())
+        self.assertEqual(
+            list(Recipe.objects.values_list('shopping_cart_count', flat=True)),
+            [0, 0]
+        )
+
+
+class SubscribeManyTests(APITestCase):
+    """Массовая подписка и отписка со счётчиками подписчиков."""
+
+    def setUp(self):
+        super().setUp()
+        self.authors = User.objects.bulk_create(
+            User(email=f'author{number}@example.org',
+                 username=f'author{number}')
+            for number in range(3)
+        )
+        Recipe.objects.create(
+            author=self.authors[0], name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/test.png'
+        )
+
+    def counters(self):
+        return list(
+            User.objects.filter(pk__in=[author.pk for author in self.authors])
+            .order_by('pk').values_list('followers_count', 'recipes_count')
+        )
+
+    def subscriptions(self, method, author_ids):
+        return getattr(self.client, method)(
+            '/api/users/subscriptions/', {'authors': author_ids},
+            format='json'
+        )
+
+    def test_subscribe_with_duplicates(self):
+        first, second, _ = (author.pk for author in self.authors)
+        response = self.subscriptions('post', [first, second, first])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            sorted(author['id'] for author in response.data), [first, second]
+        )
+        response = self.subscriptions('post', [first])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.user.follower.count(), 2)
+        self.assertEqual(self.counters(), [(1, 1), (1, 0), (0, 0)])
+
+    def test_self_subscribe_refused(self):
+        response = self.subscriptions(
+            'post', [self.authors[0].pk, self.user.pk]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.counters(), [(0, 1), (0, 0), (0, 0)])
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).followers_count, 0
+        )
+
+    def test_unsubscribe(self):
+        first, second, third = (author.pk for author in self.authors)
+        self.subscriptions('post', [first, second])
+        response = self.subscriptions('delete', [first, third, first])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(self.user.follower.values_list('author_id', flat=True)),
+            [second]
+        )
+        self.assertEqual(self.counters(), [(0, 1), (1, 0), (0, 0)])
+        response = self.subscriptions('delete', [third])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counters(), [(0, 1), (1, 0), (0, 0)])
+
+
+class CounterTests(APITestCase):
+    """Денормализованные счётчики рецептов и пользователей."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(2)
+        self.recipe = Recipe.objects.order_by('pk').first()
+        self.reader = User.objects.create(
+            email='reader@example.org', username='reader'
+        )
+
+    def counts(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.user.pk)
+        return (
+            recipe.favorites_count, recipe.shopping_cart_count,
+            author.recipes_count, author.followers_count
+        )
+
+    def test_signals(self):
+        self.assertEqual(self.counts(), (0, 0, 2, 0))
+        favorite = Favorite.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.counts(), (1, 1, 2, 1))
+        favorite.delete()
+        self.reader.shopping_cart.all().delete()
+        self.reader.follower.all().delete()
+        self.assertEqual(self.counts(), (0, 0, 2, 0))
+        Recipe.objects.exclude(pk=self.recipe.pk).delete()
+        self.assertEqual(self.counts(), (0, 0, 1, 0))
+
+    def test_stale_instance_keeps_counters(self):
+        self.use_temporary_media_root()
+        stale = User.objects.get(pk=self.user.pk)
+        Subscription.objects.create(user=self.reader, author=self.user)
+        serializer = UserAvatarSerializer(
+            stale, data={'avatar': image_data_uri()}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.counts(), (0, 0, 2, 1))
+        self.assertTrue(User.objects.get(pk=self.user.pk).avatar)
+
+    def test_recount_counters_repairs_values(self):
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(user=self.reader, author=self.user)
+        Recipe.objects.update(favorites_count=7, shopping_cart_count=3)
+        User.objects.update(recipes_count=5, followers_count=4)
+        out = io.StringIO()
+        call_command('recount_counters', batch_size=1, stdout=out)
+        self.assertEqual(self.counts(), (1, 0, 2, 1))
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk').values_list(
+                'favorites_count', 'shopping_cart_count'
+            )),
+            [(1, 0), (0, 0)]
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.reader.pk).recipes_count, 0
+        )
+        self.assertIn('исправлено записей: 2', out.getvalue())
+
+
+class BatchTests(APITestCase):
+    """Пакет запросов на чтение через /api/batch/."""
+
+    def batch(self, client, *urls):
+        return client.post('/api/batch/', {'requests': [
+            {'url': url} for url in urls
+        ]}, format='json')
+
+    def test_invalid_urls(self):
+        for url in ('/admin/', 'http://example.org/api/tags/', '/api/batch/'):
+            with self.subTest(url=url):
+                response = self.batch(self.client, url)
+                self.assertEqual(response.status_code, 400)
+
+    def test_max_requests(self):
+        urls = ['/api/tags/'] * settings.BATCH_MAX_REQUESTS
+        self.assertEqual(self.batch(self.client, *urls).status_code, 200)
+        response = self.batch(self.client, *urls, '/api/tags/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous_subrequests(self):
+        response = self.batch(
+            APIClient(), '/api/tags/', '/api/users/me/', '/api/nowhere/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data], [200, 401, 404]
+        )
+        self.assertEqual(len(response.data[0]['body']), 3)
+
+    def test_non_json_response(self):
+        response = self.batch(
+            self.client, '/api/recipes/download_shopping_cart/'
+        )
+        self.assertEqual(response.data[0]['status'], 406)
+
+    def test_authenticates_once(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(
+                client, '/api/users/me/', '/api/tags/',
+                f'/api/users/{self.user.pk}/'
+            )
+        self.assertEqual(
+            [result['status'] for result in response.data], [200] * 3
+        )
+        self.assertEqual(response.data[0]['body']['email'], self.user.email)
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if Token._meta.db_table in query['sql']
+        ]), 1)
+
+
+class SharedCacheCheckTests(TestCase):
+    """Проверка общего кэша для развёртывания."""
+
+    LOCAL = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }}
+    SHARED = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'foodgram_cache',
+    }}
+
+    def test_local_cache_without_debug(self):
+        with override_settings(DEBUG=False, CACHES=self.LOCAL):
+            errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['api.E001'])
+
+    def test_shared_cache_or_debug(self):
+        for debug, caches in ((False, self.SHARED), (True, self.LOCAL)):
+            with self.subTest(debug=debug):
+                with override_settings(DEBUG=debug, CACHES=caches):
+                    self.assertEqual(check_shared_cache(None), [])
+
+
+class RecipeSearchTests(APITestCase):
+    """Полнотекстовый поиск рецептов."""
+
+    def create_recipe(self, name, text='Описание'):
+        return Recipe.objects.create(
+            author=self.user, name=name, text=text, cooking_time=10,
+            image='recipes/images/test.png'
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_search_ranks_name_above_text(self):
+        in_text = self.create_recipe('Щи', 'Подавать с борщом')
+        in_name = self.create_recipe('Борщ', 'Свёкла и капуста')
+        self.create_recipe('Плов')
+        self.assertEqual(self.search('борщ'), [in_name.pk, in_text.pk])
+        self.assertEqual(self.search('свекла'), [in_name.pk])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_cursor_refused_with_search(self):
+        self.create_recipe('Борщ')
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': ''}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        response = APIClient().get(
+            '/api/recipes/', {'search': 'борщ', 'cursor': ''}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'search_vector есть на PostgreSQL.'
+    )
+    def test_search_vector(self):
+        in_text = self.create_recipe('Щи', 'Подавать со свёклой и борщами')
+        in_name = self.create_recipe('Борщ украинский', 'Свёкла и капуста')
+        self.create_recipe('Плов', 'Рис и морковь')
+        self.assertEqual(self.search('борщи'), [in_name.pk, in_text.pk])
+        self.assertEqual(self.search('капусты'), [in_name.pk])
+        self.assertEqual(self.search('-капуста борщ'), [in_text.pk])
+        recipe = Recipe.objects.get(pk=in_text.pk)
+        recipe.text = 'Подавать со сметаной'
+        recipe.save(update_fields=('text',))
+        self.assertEqual(self.search('борщ'), [in_name.pk])
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'page': 1, 'limit': 1}
+        )
+        self.assertEqual(response.data['count'], 1)
+
+    def test_restore_dropped_triggers(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Триггеры FTS5 есть только на SQLite.')
+        recipe = self.create_recipe('Борщ')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER recipes_recipe_fts_insert')
+            cursor.execute('DROP TRIGGER recipes_recipe_fts_update')
+        self.assertEqual(restore_search_triggers(), [
+            'recipes_recipe_fts_insert', 'recipes_recipe_fts_update'
+        ])
+        self.assertEqual(restore_search_triggers(), [])
+        added = self.create_recipe('Борщ зелёный')
+        self.assertEqual(self.search('борщ'), [recipe.pk, added.pk])
+
+
+@override_settings(CHUNKED_UPLOAD_DIR=os.path.join(MEDIA_ROOT, 'uploads'))
+class ChunkedUploadTests(APITestCase):
+    """Изображение, загруженное частями, в поле аватара."""
+
+    def upload(self, content):
+        token = self.client.post(
+            '/api/uploads/', {'size': len(content)}, format='json'
+        ).data['token']
+        for start in range(0, len(content), 100):
+            part = content[start:start + 100]
+            response = self.client.generic(
+                'PUT', f'/api/uploads/{token}/', part,
+                content_type='application/octet-stream',
+                HTTP_CONTENT_RANGE=(
+                    f'bytes {start}-{start + len(part) - 1}/{len(content)}'
+                )
+            )
+            self.assertEqual(response.status_code, 200, response.data)
+        return ImageUpload.objects.get(token=token)
+
+    def test_upload_is_moved_and_deleted_after_save(self):
+        content = base64.b64decode(image_data_uri((20, 20)).split(',')[1])
+        upload = self.upload(content)
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': f'upload:{upload.token}'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload.path))
+        self.user.refresh_from_db()
+        with self.user.avatar.open('rb') as avatar:
+            self.assertEqual(avatar.read(), content)
+
+    def test_missing_part_file(self):
+        upload = self.upload(b'x' * 10)
+        os.remove(upload.path)
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': f'upload:{upload.token}'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_content_range_must_match_part_and_size(self):
+        token = self.client.post(
+            '/api/uploads/', {'size': 10}, format='json'
+        ).data['token']
+        for content_range in (
+            'bytes 0-9/10', 'bytes 0-3/10', 'bytes 0-4/11', 'bytes=0-4'
+        ):
+            with self.subTest(content_range=content_range):
+                response = self.client.generic(
+                    'PUT', f'/api/uploads/{token}/', b'x' * 5,
+                    content_type='application/octet-stream',
+                    HTTP_CONTENT_RANGE=content_range
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(ImageUpload.objects.get(token=token).offset, 0)
+        response = self.client.generic(
+            'PUT', f'/api/uploads/{token}/', b'x' * 5,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE='bytes 0-4/10'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['offset'], 5)
+
+
+class ImportTagsTests(APITestCase):
+    """Загрузка тегов командой load_tags."""
+
+    def load_tags(self, tags):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'tags.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(tags, file, ensure_ascii=False)
+        call_command('load_tags', file=path, stdout=io.StringIO())
+
+    def test_conflict_on_other_unique_field_fails(self):
+        with self.assertRaisesMessage(CommandError, 'tags.json'):
+            self.load_tags([
+                {'slug': 'new', 'name': 'Новый'},
+                {'slug': 'duplicate', 'name': self.tags[0].name},
+            ])
+        self.assertFalse(Tag.objects.filter(slug='new').exists())
+
+
+class ImportIngredientsTests(APITestCase):
+    """Загрузка ингредиентов командой load_ingredients из CSV."""
+
+    def load(self, lines, *args):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'ingredients.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+        out = io.StringIO()
+        call_command('load_ingredients', *args, file=path, stdout=out)
+        return [
+            int(line.rsplit(':', 1)[1]) for line in out.getvalue().splitlines()
+            if line.startswith(('Создано', 'Обновлено', 'Пропущено'))
+        ]
+
+    def test_csv_with_and_without_header(self):
+        self.assertEqual(self.load(['Мука,г', 'Соль,"ч. л."']), [2, 0, 0])
+        self.assertEqual(
+            self.load(['measurement_unit,name', 'мл,Молоко']), [1, 0, 0]
+        )
+        self.assertEqual(
+            dict(Ingredient.objects.filter(
+                name__in=('Мука', 'Соль', 'Молоко')
+            ).values_list('name', 'measurement_unit')),
+            {'Мука': 'г', 'Соль': 'ч. л.', 'Молоко': 'мл'}
+        )
+
+    def test_counts_on_reimport_with_upsert(self):
+        lines = [
+            'Ингредиент 0,г', 'Ингредиент 1,кг', 'Мука,г', 'Мука,г'
+        ]
+        self.assertEqual(self.load(lines), [1, 0, 3])
+        self.assertEqual(
+            Ingredient.objects.get(name='Ингредиент 1').measurement_unit, 'г'
+        )
+        self.assertEqual(self.load(lines, '--upsert'), [0, 1, 3])
+        self.assertEqual(
+            Ingredient.objects.get(name='Ингредиент 1').measurement_unit, 'кг'
+        )
+        self.assertEqual(self.load(lines, '--upsert'), [0, 0, 4])
+        self.assertEqual(Ingredient.objects.count(), 51)
+
+
+class ImportRecipesTests(APITestCase):
+    """Загрузка рецептов командой import_recipes."""
+
+    def test_export_import_round_trip(self):
+        self.use_temporary_media_root()
+        self.create_recipes(2)
+        images = {}
+        for recipe in Recipe.objects.all():
+            recipe.image.save(
+                f'dish{recipe.pk}.png', ContentFile(f'png {recipe.pk}'),
+                save=False
+            )
+            recipe.save(update_fields=('image',))
+            images[recipe.name] = (recipe.image.name, f'png {recipe.pk}')
+
+        def snapshot():
+            return {
+                recipe.name: (
+                    recipe.author_id, recipe.text, recipe.cooking_time,
+                    recipe.pub_date, recipe.image.name,
+                    sorted(tag.slug for tag in recipe.tags.all()),
+                    sorted(
+                        (amount.ingredient_id, amount.amount)
+                        for amount in recipe.ingredient_amounts.all()
+                    ),
+                )
+                for recipe in Recipe.objects.prefetch_related(
+                    'tags', 'ingredient_amounts'
+                )
+            }
+
+        exported = snapshot()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.ndjson')
+        images_dir = os.path.join(directory, 'images')
+        call_command(
+            'export_recipes', file=path, images_dir=images_dir,
+            stderr=io.StringIO()
+        )
+        Recipe.objects.all().delete()
+        for name, _ in images.values():
+            default_storage.delete(name)
+
+        for created, skipped in ((2, 0), (0, 2)):
+            out = io.StringIO()
+            call_command(
+                'import_recipes', file=path, images_dir=images_dir,
+                stdout=out, stderr=io.StringIO()
+            )
+            self.assertIn(f'Создано новых записей: {created}', out.getvalue())
+            self.assertIn(
+                f'Пропущено существующих: {skipped}', out.getvalue()
+            )
+            self.assertEqual(snapshot(), exported)
+        for name, content in images.values():
+            with default_storage.open(name) as file:
+                self.assertEqual(file.read().decode(), content)
+        self.assertEqual(User.objects.get(pk=self.user.pk).recipes_count, 2)
+
+    def test_non_object_records_are_reported(self):
+        record = {
+            'name': 'Борщ', 'author': self.user.email, 'text': 'Описание',
+            'cooking_time': 60, 'image': 'recipes/images/test.png',
+            'tags': [self.tags[0].slug],
+            'ingredients': [{
+                'name': self.ingredients[0].name,
+                'measurement_unit': self.ingredients[0].measurement_unit,
+                'amount': 300,
+            }],
+        }
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(
+                ('[1, 2]', '"борщ"', 'null', json.dumps(record))
+            ))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(
+            'import_recipes', file=path, stdout=stdout, stderr=stderr
+        )
+        self.assertIn('Ошибок: 3', stdout.getvalue())
+        self.assertEqual(stderr.getvalue().count('JSON-объектом'), 3)
+        self.assertTrue(Recipe.objects.filter(name='Борщ').exists())
+
+
+class ShoppingListExportTests(APITestCase):
+    """Выгрузка списка покупок в текстовых форматах и её кэш."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': list(Recipe.objects.values_list('pk', flat=True))},
+                format='json'
+            )
+
+    def download(self, file_format):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            {'file_format': file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="shopping_list.{file_format}"'
+        )
+        return response, b''.join(response).decode()
+
+    def test_formats(self):
+        response, content = self.download('txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(content, '\n'.join(
+            f'Ингредиент {number} г — 3' for number in range(3)
+        ))
+        response, content = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(content.splitlines(), [
+            'Ингредиент,Единица измерения,Количество',
+            *(f'Ингредиент {number},г,3' for number in range(3)),
+        ])
+        response, content = self.download('json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(content), [
+            {'name': f'Ингредиент {number}', 'measurement_unit': 'г',
+             'amount': 3}
+            for number in range(3)
+        ])
+
+    def test_cache_invalidated_by_cart_change(self):
+        self.download('txt')
+        with self.assertNumQueries(0):
+            self.download('txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                f'/api/recipes/{Recipe.objects.order_by("pk")[0].pk}'
+                '/shopping_cart/'
+            )
+        _, content = self.download('txt')
+        self.assertEqual(content, '\n'.join(
+            f'Ингредиент {number} г — 2' for number in range(3)
+        ))
+
+    def test_cache_invalidated_by_ingredient_rename(self):
+        self.download('csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = self.ingredients[0]
+            ingredient.name = 'Мука'
+            ingredient.save()
+        _, content = self.download('csv')
+        self.assertIn('Мука,г,3', content.splitlines())
+
+
+class ShoppingListPdfTests(APITestCase):
+    """Список покупок в PDF."""
+
+    def test_render_timeout_returns_503(self):
+        # Задача уже выполняется и не завершится: ожидание истекает,
+        # а отменить её нельзя.
+        future = Future()
+        future.set_running_or_notify_cancel()
+        executor = mock.Mock(**{'submit.return_value': future})
+        slots = threading.BoundedSemaphore(1)
+        with mock.patch('api.exports._get_pdf_executor',
+                        return_value=executor), \
+                mock.patch('api.exports._pdf_slots', slots), \
+                self.settings(SHOPPING_LIST_PDF_TIMEOUT=0):
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/',
+                {'file_format': 'pdf'}
+            )
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '5')
+            # Место в очереди занято, пока задача не завершилась.
+            self.assertFalse(slots.acquire(blocking=False))
+            future.set_result(b'%PDF')
+            self.assertTrue(slots.acquire(blocking=False))
+
+    def test_missing_font_is_an_error(self):
+        missing = os.path.join(tempfile.gettempdir(), 'missing-font.ttf')
+        with self.settings(SHOPPING_LIST_PDF_FONT=missing):
+            with self.assertRaises(OSError):
+                render_pdf([('Мука', 'г', 100)])
+            errors = check_pdf_font(None)
+        self.assertEqual([error.id for error in errors], ['api.E002'])
+
+
+class IngredientSearchIndexTests(TestCase):
+    """Поиск ингредиентов по индексу в памяти."""
+
+    ROWS = (
+        (1, 'Ванильный сахар', 'г'),
+        (2, 'Сахарная пудра', 'г'),
+        (3, 'Сахар', 'г'),
+        (4, 'Свёкла', 'шт'),
+        (5, 'Мёд', 'г'),
+        (6, 'Тростниковый сахар', 'г'),
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, limit=None):
+        index = IngredientSearchIndex(self.ROWS)
+        return [pk for pk, _, _ in index.search(query, limit=limit)]
+
+    def test_prefix_matches_before_substring_matches(self):
+        self.assertEqual(self.search('сах'), [3, 2, 1, 6])
+
+    def test_case_and_yo_folding(self):
+        for query in ('свекла', 'СВЁКЛА', 'Свек', 'ЕКЛ'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [4])
+        self.assertEqual(self.search('мед'), [5])
+
+    def test_short_substring(self):
+        self.assertEqual(self.search('ед'), [5])
+
+    def test_limit(self):
+        self.assertEqual(self.search('сах', limit=3), [3, 2, 1])
+        self.assertEqual(self.search('сах', limit=1), [3])
+        self.assertEqual(self.search('сах', limit=0), [])
+        self.assertEqual(self.search('нет такого'), [])
+
+    def test_index_is_rebuilt_after_version_bump(self):
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        index = get_ingredient_index()
+        self.assertIs(get_ingredient_index(), index)
+        self.assertEqual(len(index.search('сол')), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.assertEqual(
+            [name for _, name, _ in get_ingredient_index().search('сол')],
+            ['Соль']
+        )
+
+    def test_api_search(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, measurement_unit=unit)
+                for _, name, unit in self.ROWS
+            )
+            bump_versions(INGREDIENTS_VERSION)
+        response = APIClient().get(
+            '/api/ingredients/', {'name': 'Сах', 'limit': 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.data],
+            ['Сахар', 'Сахарная пудра']
+        )
+        response = APIClient().get(
+            '/api/ingredients/', {'name': 'сах', 'limit': 'x'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogSnapshotTests(APITestCase):
+    """Снимок каталога тегов в разных кодировках."""
+
+    DECODE = {
+        'br': brotli.decompress,
+        'gzip': gzip.decompress,
+        'identity': lambda content: content,
+    }
+
+    def test_encodings(self):
+        client = APIClient()
+        etags = set()
+        for encoding, header in (
+            ('br', 'gzip, deflate, br'), ('gzip', 'gzip;q=1, br;q=0'),
+            ('identity', ''),
+        ):
+            with self.subTest(encoding=encoding):
+                response = client.get(
+                    '/api/tags/', HTTP_ACCEPT_ENCODING=header
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.get('Content-Encoding'),
+                    None if encoding == 'identity' else encoding
+                )
+                self.assertIn('Accept-Encoding', response['Vary'])
+                tags = json.loads(self.DECODE[encoding](response.content))
+                self.assertEqual(
+                    [tag['slug'] for tag in tags], ['tag0', 'tag1', 'tag2']
+                )
+                etags.add(response['ETag'])
+                self.assertEqual(client.get(
+                    '/api/tags/', HTTP_ACCEPT_ENCODING=header,
+                    HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code, 304)
+        self.assertEqual(len(etags), 3)
+
+
+@job('tests.flaky')
+def flaky_job(fail):
+    if fail:
+        raise RuntimeError('сбой задачи')
+
+
+@override_settings(JOBS_RETRY_DELAY=10, JOBS_RETRY_MAX_DELAY=30)
+class JobQueueTests(TestCase):
+    """Очередь фоновых задач: повторы, ошибки и зависшие задачи."""
+
+    def test_retry_with_backoff_then_failed(self):
+        enqueue('tests.flaky', True, max_attempts=3)
+        for attempt, delay in ((1, 10), (2, 20)):
+            started = timezone.now()
+            job, = claim('worker')
+            self.assertEqual(job.attempts, attempt)
+            with self.assertLogs('jobs.queue', 'WARNING'):
+                self.assertFalse(run_job(job))
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertEqual(job.locked_by, '')
+            self.assertIn('сбой задачи', job.last_error)
+            wait = (job.run_at - started).total_seconds()
+            self.assertTrue(delay / 2 <= wait <= delay + 1, wait)
+            self.assertEqual(claim('worker'), [])
+            Job.objects.update(run_at=timezone.now())
+        job, = claim('worker')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_delay_is_capped(self):
+        for _ in range(20):
+            self.assertLessEqual(retry_delay(10), timedelta(seconds=30))
+            self.assertGreaterEqual(retry_delay(10), timedelta(seconds=15))
+
+    def test_success(self):
+        enqueue('tests.flaky', False)
+        job, = claim('worker')
+        self.assertTrue(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeue_stale(self):
+        enqueue('tests.flaky', False, max_attempts=2)
+        enqueue('tests.flaky', False, max_attempts=1)
+        retried, exhausted = claim('worker', limit=2)
+        Job.objects.update(started_at=timezone.now() - timedelta(
+            seconds=settings.JOBS_LOCK_TIMEOUT + 1
+        ))
+        self.assertEqual(requeue_stale(), 2)
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retried.status, retried.locked_by), (Job.QUEUED, ''))
+        self.assertEqual(exhausted.status, Job.FAILED)
+
+    def test_stale_worker_does_not_overwrite_result(self):
+        enqueue('tests.flaky', True)
+        stale, = claim('stale')
+        Job.objects.update(started_at=timezone.now() - timedelta(
+            seconds=settings.JOBS_LOCK_TIMEOUT + 1
+        ))
+        requeue_stale()
+        current, = claim('current')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_job(stale)
+        current.refresh_from_db()
+        self.assertEqual(
+            (current.status, current.locked_by), (Job.RUNNING, 'current')
+        )
+        self.assertEqual(current.last_error, '')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_job(current)
+        current.refresh_from_db()
+        self.assertEqual(current.status, Job.QUEUED)
+        self.assertIn('сбой задачи', current.last_error)
+
+
+@override_settings(RECIPE_IMAGE_WIDTHS=(320, 640, 1280))
+class ImageDerivativesTests(APITestCase):
+    """Уменьшенные копии изображений, манифест и srcset."""
+
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_media_root()
+
+    def image(self, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_render_derivatives(self):
+        rendered = render_derivatives(self.image((800, 400)), (320, 640, 1280))
+        self.assertEqual(
+            {extension: sorted(files)
+             for extension, files in rendered.items()},
+            {'webp': [320, 640], 'jpg': [320, 640]}
+        )
+        with Image.open(io.BytesIO(rendered['webp'][320])) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 160)))
+        with Image.open(io.BytesIO(rendered['jpg'][640])) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (640, 320)))
+        rendered = render_derivatives(self.image((100, 50)), (320, 640))
+        self.assertEqual(list(rendered['webp']), [100])
+
+    def test_manifest_and_srcset(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание', cooking_time=10,
+            image=ContentFile(self.image((800, 400)), 'dish.png')
+        )
+        self.assertTrue(Job.objects.filter(
+            name='images.derivatives', args=['recipes.Recipe', recipe.pk]
+        ).exists())
+        generate_derivatives(Recipe, recipe.pk)
+        recipe.refresh_from_db()
+        manifest = recipe.image_derivatives
+        self.assertEqual(manifest['source'], recipe.image.name)
+        self.assertEqual(sorted(manifest['webp']), ['320', '640'])
+        for name in manifest_names(manifest):
+            self.assertTrue(default_storage.exists(name))
+        self.assertFalse(needs_derivatives(recipe))
+
+        srcset = self.client.get(f'/api/recipes/{recipe.pk}/').data[
+            'image_srcset'
+        ]
+        self.assertEqual(srcset['jpg'], ', '.join(
+            f'http://testserver{default_storage.url(manifest["jpg"][width])}'
+            f' {width}w'
+            for width in ('320', '640')
+        ))
+
+        old_files = manifest_names(manifest)
+        recipe.image = ContentFile(self.image((400, 200)), 'new.png')
+        recipe.save(update_fields=('image',))
+        self.assertTrue(needs_derivatives(recipe))
+        generate_derivatives(Recipe, recipe.pk)
+        recipe.refresh_from_db()
+        self.assertEqual(sorted(recipe.image_derivatives['jpg']), ['320'])
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name))
@@ -1,7 +1,15 @@
+import os
+import re
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.utils import timezone
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
@@ -9,30 +17,83 @@ from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-
-from api.pagination import SubscriptionPagination
-from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             RecipeSerializer, ShoppingCartSerializer,
+from rest_framework.views import APIView
+
+from api.batch import dispatch_batch
+from api.cache import (INGREDIENTS_VERSION, RECIPE_LIST_PARAMS,
+                       RECIPES_VERSION, REFERENCES_VERSION, TAGS_VERSION,
+                       apply_user_fields, build_cache_key, bump_versions,
+                       cached_response, conditional_get, get_user_recipe_sets,
+                       recipe_cache_keys, recipe_version,
+                       shopping_list_version, strip_user_fields, user_version)
+from api.exports import SHOPPING_LIST_FORMATS, shopping_list_response
+from api.models import ImageUpload
+from api.pagination import RecipePagination, SubscriptionPagination
+from api.search import get_ingredient_index, search_recipes
+from api.serializers import (BatchSerializer, FavoriteSerializer,
+                             ImageUploadSerializer, IngredientSerializer,
+                             RecipeMinifiedSerializer, RecipeSerializer,
+                             ShoppingCartManySerializer,
+                             ShoppingCartSerializer, SubscribeManySerializer,
                              SubscribeSerializer, SubscriptionSerializer,
                              TagSerializer, UserAvatarSerializer,
                              UserReadSerializer)
+from api.short_links import get_recipe_ids, short_link, valid_id
+from api.snapshots import catalog_response
 from ingredients.models import Ingredient
-from recipes.models import IngredientInRecipe, Recipe
+from recipes.bulk import (add_to_shopping_cart, clear_shopping_cart,
+                          subscribe_many, unsubscribe_many)
+from recipes.models import Favorite, Recipe, ShoppingCart
 from tags.models import Tag
+from users.models import Subscription
 
 User = get_user_model()
 
+CONTENT_RANGE = re.compile(r'bytes (?P<start>\d+)-(?P<end>\d+)/(?P<total>\d+)')
+# Размер блока, которым часть загрузки копируется из запроса в файл.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def annotate_is_subscribed(queryset, user):
+    """Одним подзапросом отмечает авторов, на которых подписан user."""
+    if user.is_anonymous:
+        return queryset
+    return queryset.annotate(
+        is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))
+        )
+    )
+
+
+def subscribed_authors(request):
+    """Авторы, на которых подписан пользователь, с последними рецептами."""
+    return (
+        User.objects
+        .filter(following__user=request.user)
+        .annotate(is_subscribed=Value(True))
+        .prefetch_related(SubscriptionSerializer.recipes_prefetch(request))
+        .order_by('-id')
+    )
+
 
 class UserViewSet(DjoserUserViewSet):
     """ViewSet для управления пользователями и подписками."""
 
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     pagination_class = SubscriptionPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = annotate_is_subscribed(queryset, self.request.user)
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ['retrieve', 'list', 'me']:
             return UserReadSerializer
         if self.action == 'subscriptions':
+            if self.request.method in ('POST', 'DELETE'):
+                return SubscribeManySerializer
             return SubscriptionSerializer
         if self.action == 'subscribe':
             return SubscribeSerializer
@@ -49,12 +110,46 @@ class UserViewSet(DjoserUserViewSet):
 
     @action(
         detail=False,
+        methods=('get', 'post', 'delete'),
         permission_classes=(permissions.IsAuthenticated,)
     )
     def subscriptions(self, request):
-        """Возвращает список авторов, на которых подписан текущий юзер."""
-        user = request.user
-        authors = User.objects.filter(following__user=user)
+        """
+        Возвращает список авторов, на которых подписан текущий юзер.
+
+        POST со списком authors подписывает на всех авторов сразу;
+        существующие подписки пропускаются. DELETE со списком authors
+        отписывает от них, авторы без подписки пропускаются.
+        """
+        authors = subscribed_authors(request)
+
+        if request.method == 'DELETE':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            if not unsubscribe_many(request.user, [
+                author.pk for author in serializer.validated_data['authors']
+            ]):
+                raise ValidationError(
+                    {'errors': 'Вы не подписаны на этих авторов.'}
+                )
+            bump_versions(user_version(request.user.pk))
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            author_ids = [
+                author.pk for author in serializer.validated_data['authors']
+            ]
+            if subscribe_many(request.user, author_ids):
+                bump_versions(user_version(request.user.pk))
+            return Response(
+                SubscriptionSerializer(
+                    authors.filter(pk__in=author_ids), many=True,
+                    context=self.get_serializer_context()
+                ).data,
+                status=status.HTTP_201_CREATED
+            )
 
         page = self.paginate_queryset(authors)
         if page is not None:
@@ -69,6 +164,15 @@ class UserViewSet(DjoserUserViewSet):
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=('post',))
+    def set_password(self, request, *args, **kwargs):
+        """Смена пароля; сохраняется только поле password."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        request.user.set_password(serializer.data['new_password'])
+        request.user.save(update_fields=('password',))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(
         detail=True,
         methods=('post', 'delete'),
@@ -80,20 +184,16 @@ class UserViewSet(DjoserUserViewSet):
         user = request.user
 
         if request.method == 'POST':
-            serializer = self.get_serializer(
-                data={'user': user.id, 'author': author.id},
-                # context={'request': request}
-            )
+            serializer = self.get_serializer(data={})
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            serializer.save(user=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        subscription = user.follower.filter(author=author)
-        if not subscription.exists():
+        deleted, _ = user.follower.filter(author=author).delete()
+        if not deleted:
             raise ValidationError(
                 {'errors': 'Вы не подписаны на этого автора.'}
             )
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -115,7 +215,8 @@ class UserViewSet(DjoserUserViewSet):
         if not user.avatar:
             raise NotFound('Аватар не найден.')
 
-        user.avatar.delete(save=True)
+        user.avatar.delete(save=False)
+        user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -124,18 +225,49 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    @conditional_get(lambda **kwargs: (TAGS_VERSION,))
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'json':
+            return catalog_response(request, 'tags')
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(lambda **kwargs: (TAGS_VERSION,))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__icontains=name)
-        return queryset
+    @conditional_get(lambda **kwargs: (INGREDIENTS_VERSION,))
+    def list(self, request, *args, **kwargs):
+        """
+        Без параметров отдаёт готовый снимок каталога, поиск
+        по ?name= выполняется по индексу в памяти, без БД.
+        """
+        query = request.query_params.get('name')
+        if not query:
+            if request.accepted_renderer.format == 'json':
+                return catalog_response(request, 'ingredients')
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None and not limit.isdigit():
+            raise ValidationError(
+                {'limit': 'Должно быть неотрицательным целым числом.'}
+            )
+        return Response([
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in get_ingredient_index().search(
+                query, limit=None if limit is None else int(limit)
+            )
+        ])
+
+    @conditional_get(lambda **kwargs: (INGREDIENTS_VERSION,))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -143,15 +275,60 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = SubscriptionPagination
+    pagination_class = RecipePagination
+
+    # Действия, в ответе которых сериализуется полный рецепт.
+    serialized_actions = (
+        'list', 'retrieve', 'create', 'update', 'partial_update'
+    )
+
+    def annotate_queryset(self, queryset):
+        """
+        Подгружает всё, что нужно RecipeSerializer, фиксированным
+        числом запросов независимо от размера страницы.
+        """
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ),
+            )
+        return queryset.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=annotate_is_subscribed(User.objects.all(), user)
+            ),
+            'tags',
+            'ingredient_amounts__ingredient',
+        )
 
     def get_queryset(self):
-        queryset = Recipe.objects.all()
+        queryset = self.filter_queryset_by_params(Recipe.objects.all())
+        if self.action in self.serialized_actions:
+            queryset = self.annotate_queryset(queryset)
+        return queryset
+
+    def filter_queryset_by_params(self, queryset):
+        """Фильтрует рецепты по параметрам запроса."""
         user = self.request.user
 
         tags_slugs = self.request.query_params.getlist('tags')
         if tags_slugs:
-            queryset = queryset.filter(tags__slug__in=tags_slugs).distinct()
+            # EXISTS вместо JOIN + DISTINCT: порядок по индексу pub_date
+            # сохраняется, а связь проверяется по индексу recipe_id.
+            queryset = queryset.filter(
+                Exists(
+                    Recipe.tags.through.objects.filter(
+                        recipe=OuterRef('pk'), tag__slug__in=tags_slugs
+                    )
+                )
+            )
 
         if user.is_authenticated:
             if self.request.query_params.get('is_favorited') == '1':
@@ -163,13 +340,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if author_id:
             queryset = queryset.filter(author__id=author_id)
 
-        return queryset.order_by('-pub_date')
+        query = self.request.query_params.get('search', '').strip()
+        if query:
+            # Курсорная пагинация упорядочивает по дате и заменила бы
+            # порядок по релевантности: результаты поиска — только
+            # постранично.
+            cursor_param = (
+                RecipePagination.cursor_pagination_class.cursor_query_param
+            )
+            if cursor_param in self.request.query_params:
+                raise ValidationError(
+                    {'cursor': 'Курсорная пагинация недоступна при поиске, '
+                               'используйте page.'}
+                )
+            return search_recipes(queryset, query).order_by(
+                '-search_rank', '-pub_date', '-id'
+            )
+        return queryset.order_by('-pub_date', '-id')
+
+    def get_recipes_data(self, pks):
+        """
+        Собирает представления рецептов: общая часть берётся из кэша
+        (или сериализуется и кэшируется для отсутствующих рецептов),
+        поверх неё накладываются флаги текущего пользователя.
+        """
+        keys = recipe_cache_keys(self.request, pks)
+        representations = cache.get_many(keys.values())
+        missing = [pk for pk in pks if keys[pk] not in representations]
+        if missing:
+            recipes = self.annotate_queryset(
+                Recipe.objects.filter(pk__in=missing)
+            )
+            fresh = {
+                keys[recipe['id']]: strip_user_fields(recipe)
+                for recipe in self.get_serializer(recipes, many=True).data
+            }
+            cache.set_many(fresh, settings.RECIPES_CACHE_TIMEOUT)
+            representations.update(fresh)
+        user_sets = get_user_recipe_sets(self.request.user)
+        return [
+            apply_user_fields(representations[keys[pk]], user_sets)
+            for pk in pks if keys[pk] in representations
+        ]
+
+    @conditional_get(lambda **kwargs: (RECIPES_VERSION,), per_user=True)
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            page = self.paginate_queryset(
+                self.filter_queryset_by_params(
+                    Recipe.objects.only('id', 'pub_date')
+                )
+            )
+            return self.get_paginated_response(
+                self.get_recipes_data([recipe.pk for recipe in page])
+            )
+        key = build_cache_key(
+            'recipes-list', request, (RECIPES_VERSION,), RECIPE_LIST_PARAMS
+        )
+        return cached_response(
+            key, partial(super().list, request, *args, **kwargs)
+        )
+
+    @conditional_get(
+        lambda pk, **kwargs: (recipe_version(pk), REFERENCES_VERSION),
+        per_user=True
+    )
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            if not str(kwargs['pk']).isdigit():
+                raise NotFound()
+            data = self.get_recipes_data([int(kwargs['pk'])])
+            if not data:
+                raise NotFound()
+            return Response(data[0])
+        key = build_cache_key(
+            'recipes-detail', request,
+            (recipe_version(kwargs['pk']), REFERENCES_VERSION)
+        )
+        return cached_response(
+            key, partial(super().retrieve, request, *args, **kwargs)
+        )
 
     def get_serializer_class(self):
         if self.action == 'favorite':
             return FavoriteSerializer
         if self.action == 'shopping_cart':
             return ShoppingCartSerializer
+        if self.action == 'shopping_cart_bulk':
+            return ShoppingCartManySerializer
         return RecipeSerializer
 
     @action(
@@ -183,19 +441,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            serializer = self.get_serializer(
-                data={'user': user.id, 'recipe': recipe.id},
-                # context={'request': request}
-            )
+            serializer = self.get_serializer(data={})
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            serializer.save(user=user, recipe=recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        favorite_instance = user.favorites.filter(recipe=recipe)
-        if not favorite_instance.exists():
+        deleted, _ = user.favorites.filter(recipe=recipe).delete()
+        if not deleted:
             raise ValidationError({'errors': 'Рецепта нет в избранном.'})
-
-        favorite_instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -208,53 +461,72 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            serializer = self.get_serializer(
-                data={'user': user.id, 'recipe': recipe.id},
-                # context={'request': request}
-            )
+            serializer = self.get_serializer(data={})
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            serializer.save(user=user, recipe=recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        cart_instance = user.shopping_cart.filter(recipe=recipe)
-        if not cart_instance.exists():
+        deleted, _ = user.shopping_cart.filter(recipe=recipe).delete()
+        if not deleted:
             raise ValidationError({'errors': 'Рецепт не найден в корзине.'})
-
-        cart_instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
-        methods=('get',),
+        methods=('post', 'delete'),
         permission_classes=(IsAuthenticated,),
-        url_path='download_shopping_cart',
+        url_path='shopping_cart',
     )
-    def download_shopping_cart(self, request):
-        """Скачать список ингредиентов из корзины."""
+    def shopping_cart_bulk(self, request):
+        """
+        POST со списком recipes добавляет рецепты в корзину одним
+        запросом к БД (уже добавленные пропускаются), DELETE очищает
+        корзину целиком.
+        """
         user = request.user
 
-        ingredients = (
-            IngredientInRecipe.objects
-            .filter(recipe__in_shopping_cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
-        )
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            recipes = list(dict.fromkeys(serializer.validated_data['recipes']))
+            if add_to_shopping_cart(user, [recipe.pk for recipe in recipes]):
+                bump_versions(
+                    user_version(user.pk), shopping_list_version(user.pk)
+                )
+            return Response(
+                RecipeMinifiedSerializer(
+                    recipes, many=True, context=self.get_serializer_context()
+                ).data,
+                status=status.HTTP_201_CREATED
+            )
 
-        shopping_list = [
-            (
-                f'{item["ingredient__name"]} '
-                f'{item["ingredient__measurement_unit"]} — '
-                f'{item["total_amount"]}'
-            ) for item in ingredients
-        ]
+        if not clear_shopping_cart(user):
+            raise ValidationError({'errors': 'Корзина покупок пуста.'})
+        bump_versions(user_version(user.pk), shopping_list_version(user.pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        content = '\n'.join(shopping_list)
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
-        )
-        return response
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(IsAuthenticated,),
+        url_path='download_shopping_cart',
+    )
+    def download_shopping_cart(self, request):
+        """
+        Скачать список ингредиентов из корзины.
+
+        Формат задаётся параметром file_format: txt (по умолчанию),
+        csv, json или pdf.
+        """
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError({
+                'file_format': (
+                    f'Допустимые значения: '
+                    f'{", ".join(SHOPPING_LIST_FORMATS)}.'
+                )
+            })
+        return shopping_list_response(request.user, file_format)
 
     @action(
         detail=True,
@@ -262,14 +534,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='get-link'
     )
     def get_short_link(self, request, pk=None):
-        recipe = self.get_object()
-        return Response(
-            {
-                'short-link': request.build_absolute_uri(
-                    reverse('recipe_short_link', args=(recipe.pk,))
-                )
-            }
-        )
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound('Рецепт не найден.')
+        if not valid_id(pk) or pk not in get_recipe_ids():
+            raise NotFound('Рецепт не найден.')
+        return Response({'short-link': short_link(request, pk)})
 
 
 class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -278,4 +549,114 @@ class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = SubscriptionPagination
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return subscribed_authors(self.request)
+
+
+def delete_expired_uploads():
+    """Удаляет брошенные загрузки старше CHUNKED_UPLOAD_TTL секунд."""
+    expired = ImageUpload.objects.filter(
+        created_at__lt=timezone.now() - timedelta(
+            seconds=settings.CHUNKED_UPLOAD_TTL
+        )
+    )
+    for upload in expired:
+        upload.delete()
+
+
+class ImageUploadViewSet(viewsets.ViewSet):
+    """
+    Загрузка изображений частями с докачкой.
+
+    POST создаёт загрузку заданного размера и возвращает токен,
+    PUT с заголовком Content-Range дописывает очередную часть,
+    GET возвращает число принятых байт. Готовая загрузка передаётся
+    в поле изображения как «upload:<token>».
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_upload(self, pk, queryset=None):
+        queryset = queryset or ImageUpload.objects.all()
+        try:
+            return queryset.get(token=pk, user=self.request.user)
+        except (ImageUpload.DoesNotExist, DjangoValidationError):
+            raise NotFound('Загрузка не найдена.')
+
+    def create(self, request):
+        serializer = ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        delete_expired_uploads()
+        upload = serializer.save(user=request.user)
+        os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+        open(upload.path, 'wb').close()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return Response(ImageUploadSerializer(self.get_upload(pk)).data)
+
+    @transaction.atomic
+    def update(self, request, pk=None):
+        upload = self.get_upload(
+            pk, ImageUpload.objects.select_for_update()
+        )
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        header = request.META.get('HTTP_CONTENT_RANGE')
+        start = upload.offset
+        if header is not None:
+            content_range = CONTENT_RANGE.fullmatch(header)
+            if content_range is None:
+                raise ValidationError(
+                    {'errors': 'Неверный заголовок Content-Range.'}
+                )
+            start = int(content_range['start'])
+            if int(content_range['end']) - start + 1 != length:
+                raise ValidationError(
+                    {'errors': 'Content-Range не совпадает с длиной части.'}
+                )
+            if int(content_range['total']) != upload.size:
+                raise ValidationError(
+                    {'errors': 'Content-Range не совпадает с размером '
+                               'загрузки.'}
+                )
+        if start != upload.offset:
+            return Response(
+                ImageUploadSerializer(upload).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        if upload.offset + length > upload.size:
+            raise ValidationError(
+                {'errors': 'Часть выходит за пределы объявленного размера.'}
+            )
+        with open(upload.path, 'r+b') as file:
+            file.seek(upload.offset)
+            while length > 0:
+                chunk = request.stream.read(min(length, UPLOAD_CHUNK_SIZE))
+                if not chunk:
+                    break
+                file.write(chunk)
+                length -= len(chunk)
+                upload.offset += len(chunk)
+        upload.save(update_fields=('offset',))
+        return Response(ImageUploadSerializer(upload).data)
+
+    def destroy(self, request, pk=None):
+        self.get_upload(pk).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchView(APIView):
+    """
+    Пакет запросов на чтение: POST {"requests": [{"method": "GET",
+    "url": "/api/tags/"}, ...]} выполняет вложенные запросы за один
+    HTTP-запрос с одной аутентификацией и возвращает
+    [{"status": ..., "body": ...}, ...] в том же порядке.
+    """
+
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            dispatch_batch(request, serializer.validated_data['requests'])
+        )
@@ -2,12 +2,16 @@ from django.http import Http404
 from django.shortcuts import redirect
 from rest_framework.decorators import api_view
 
-from recipes.models import Recipe
+from api.short_links import get_recipe_ids
 
 
 @api_view(('GET',))
 def recipe_short_redirect(request, pk):
-    """Обрабатывает короткую ссылку и перенаправляет на полный URL."""
-    if not Recipe.objects.filter(pk=pk).exists():
+    """
+    Обрабатывает короткую ссылку и перенаправляет на полный URL.
+    Существование рецепта проверяется по множеству id процесса,
+    обычно без запроса к БД.
+    """
+    if pk not in get_recipe_ids():
         raise Http404(f'id={pk} рецепт не найден.')
     return redirect(f'/recipes/{pk}/')
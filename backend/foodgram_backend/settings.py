@@ -56,6 +56,8 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'tags.apps.TagsConfig',
     'ingredients.apps.IngredientsConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -113,6 +115,82 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        # По умолчанию Django хранит 300 записей — меньше, чем страниц
+        # списков и карточек рецептов, которые держит кэш ответов.
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+# Время жизни закэшированных ответов со списками и карточками рецептов.
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+# Каталог для снимков тегов и ингредиентов, раздаваемых через nginx.
+CATALOG_SNAPSHOT_DIR = os.getenv('CATALOG_SNAPSHOT_DIR')
+
+# Ограничения для изображений, загружаемых в Base64.
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_SIDE = int(os.getenv('IMAGE_UPLOAD_MAX_SIDE', 6000))
+
+# Уменьшенные копии изображений (WebP и JPEG): ширины в пикселях.
+# Копии строят воркеры очереди фоновых задач (manage.py run_workers).
+RECIPE_IMAGE_WIDTHS = tuple(
+    int(width)
+    for width in os.getenv('RECIPE_IMAGE_WIDTHS', '320,640,1280').split(',')
+)
+AVATAR_IMAGE_WIDTHS = tuple(
+    int(width)
+    for width in os.getenv('AVATAR_IMAGE_WIDTHS', '64,128,256').split(',')
+)
+
+# Очередь фоновых задач: число воркеров run_workers, пауза при пустой
+# очереди, попытки и задержки повторов (с), время, после которого
+# выполняемая задача считается зависшей, и срок хранения выполненных.
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_RETRY_MAX_DELAY = int(os.getenv('JOBS_RETRY_MAX_DELAY', 60 * 60))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 10 * 60))
+JOBS_KEEP_DONE = int(os.getenv('JOBS_KEEP_DONE', 7 * 24 * 60 * 60))
+JOBS_STATS_INTERVAL = int(os.getenv('JOBS_STATS_INTERVAL', 60))
+
+# Загрузка изображений частями: каталог для частей и время жизни загрузки.
+CHUNKED_UPLOAD_DIR = os.getenv(
+    'CHUNKED_UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads')
+)
+CHUNKED_UPLOAD_TTL = int(os.getenv('CHUNKED_UPLOAD_TTL', 24 * 60 * 60))
+
+# Наибольшее число вложенных запросов в POST /api/batch/.
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+
+# Короткие ссылки: доля ложноположительных ответов фильтра Блума по id
+# рецептов и размер кэша проверенных в БД id в каждом процессе.
+SHORT_LINK_FILTER_ERROR_RATE = float(
+    os.getenv('SHORT_LINK_FILTER_ERROR_RATE', 0.01)
+)
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+
+# Рендер списка покупок в PDF: размер пула процессов, таймаут и шрифт.
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 2))
+SHOPPING_LIST_PDF_TIMEOUT = int(os.getenv('SHOPPING_LIST_PDF_TIMEOUT', 30))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
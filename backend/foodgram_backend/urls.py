@@ -17,13 +17,22 @@ Including another URLconf
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, register_converter
+
+from api.short_links import Base62Converter
 from foodgram_backend.links import recipe_short_redirect
 
+register_converter(Base62Converter, 'base62')
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<int:pk>/', recipe_short_redirect, name='recipe_short_link')
+    path('r/<base62:pk>/', recipe_short_redirect, name='recipe_short_link'),
+    # Ссылки с десятичным id, выданные до перехода на коды base62.
+    path(
+        's/<int:pk>/', recipe_short_redirect,
+        name='recipe_short_link_legacy'
+    ),
 ]
 
 if settings.DEBUG:
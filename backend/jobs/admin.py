@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_at', 'created_at',
+        'finished_at'
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = (
+        'attempts', 'created_at', 'started_at', 'finished_at', 'locked_by',
+        'last_error'
+    )
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import format_stats, queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Метрики очереди фоновых задач: глубина, ожидание, выполнение'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=15 * 60,
+            help='Окно в секундах для метрик завершённых задач.',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести метрики в JSON (для систем мониторинга).',
+        )
+
+    def handle(self, **options):
+        stats = queue_stats(window=options['window'])
+        if options['json']:
+            self.stdout.write(json.dumps(stats))
+            return
+        self.stdout.write(format_stats(stats))
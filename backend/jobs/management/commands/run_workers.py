@@ -0,0 +1,128 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from jobs.queue import (claim, format_stats, purge_finished, queue_stats,
+                        requeue_stale, run_job, worker_name)
+
+
+def work(stop, burst, poll_interval):
+    """
+    Цикл воркера: забирает готовые задачи по одной и выполняет их,
+    пока не выставлен stop; в режиме burst — пока есть готовые задачи.
+    """
+    worker = worker_name()
+    try:
+        while not stop.is_set():
+            try:
+                jobs = claim(worker)
+            except OperationalError:
+                # SQLite занят другим воркером — попробуем позже.
+                jobs = []
+            if not jobs:
+                if burst:
+                    return
+                stop.wait(poll_interval)
+                continue
+            for job in jobs:
+                run_job(job)
+    finally:
+        connections.close_all()
+
+
+def work_in_process(stop, burst, poll_interval):
+    # Ctrl+C получает вся группа процессов; останавливаемся по stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(stop, burst, poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркеров очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help='Количество воркеров.',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=('threads', 'processes'),
+            default='threads',
+            help='Запускать воркеры потоками или процессами.',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+
+    def handle(self, **options):
+        if options['mode'] == 'processes':
+            # Дочерние процессы не должны наследовать соединения с БД.
+            connections.close_all()
+            stop = multiprocessing.Event()
+            worker_class = multiprocessing.Process
+            target = work_in_process
+        else:
+            stop = threading.Event()
+            worker_class = threading.Thread
+            target = work
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+
+        requeue_stale()
+        workers = [
+            worker_class(
+                target=target,
+                args=(stop, options['burst'], options['poll_interval']),
+                daemon=True
+            )
+            for _ in range(max(1, options['concurrency']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            f'Запущено воркеров: {len(workers)} ({options["mode"]})'
+        )
+
+        try:
+            self.supervise(workers, stop)
+        except KeyboardInterrupt:
+            stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(format_stats(queue_stats()))
+
+    def supervise(self, workers, stop):
+        """
+        Пока воркеры работают, периодически возвращает в очередь
+        зависшие задачи, чистит выполненные и пишет метрики очереди.
+        """
+        next_report = time.monotonic() + settings.JOBS_STATS_INTERVAL
+        while not stop.is_set() and any(
+            worker.is_alive() for worker in workers
+        ):
+            stop.wait(1)
+            if time.monotonic() < next_report:
+                continue
+            next_report = time.monotonic() + settings.JOBS_STATS_INTERVAL
+            try:
+                requeue_stale()
+                purge_finished()
+                self.stdout.write(format_stats(queue_stats()))
+            except OperationalError as error:
+                self.stderr.write(f'Очередь недоступна: {error}')
+            finally:
+                connections.close_all()
@@ -0,0 +1,244 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from statistics import quantiles
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Имя задачи -> функция-обработчик.
+_handlers = {}
+
+
+def job(name):
+    """Регистрирует функцию как обработчик задачи name."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, *args, delay=0, max_attempts=None):
+    """
+    Ставит задачу в очередь. Запись создаётся в текущей транзакции,
+    поэтому при её откате задача не появится. Аргументы должны
+    сериализоваться в JSON.
+    """
+    if name not in _handlers:
+        raise LookupError(f'Неизвестная задача: {name}.')
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS
+    )
+
+
+def enqueue_many(name, args_list, batch_size=1000):
+    """Ставит в очередь задачи name с аргументами args_list пачками."""
+    if name not in _handlers:
+        raise LookupError(f'Неизвестная задача: {name}.')
+    now = timezone.now()
+    Job.objects.bulk_create(
+        (
+            Job(
+                name=name, args=list(args), run_at=now,
+                max_attempts=settings.JOBS_MAX_ATTEMPTS
+            )
+            for args in args_list
+        ),
+        batch_size=batch_size
+    )
+
+
+def worker_name():
+    """Идентификатор воркера: хост, процесс и поток."""
+    return (
+        f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    )[:100]
+
+
+def claim(worker, limit=1):
+    """
+    Забирает до limit готовых задач и помечает их выполняемыми.
+
+    На PostgreSQL строки выбираются через SELECT ... FOR UPDATE SKIP
+    LOCKED, и воркеры не ждут друг друга. SQLite строки не блокирует:
+    там задачу получает воркер, чей UPDATE с условием на статус
+    действительно изменил строку.
+    """
+    now = timezone.now()
+    ready = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).order_by('run_at', 'id')
+    changes = {
+        'status': Job.RUNNING,
+        'locked_by': worker,
+        'started_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pks = list(
+                ready.select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)[:limit]
+            )
+            Job.objects.filter(pk__in=pks).update(**changes)
+    else:
+        pks = [
+            pk for pk in ready.values_list('pk', flat=True)[:limit]
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**changes)
+        ]
+    return list(Job.objects.filter(pk__in=pks).order_by('run_at', 'id'))
+
+
+def retry_delay(attempt):
+    """Экспоненциальная задержка перед повтором со случайным разбросом."""
+    delay = min(
+        settings.JOBS_RETRY_MAX_DELAY,
+        settings.JOBS_RETRY_DELAY * 2 ** (attempt - 1)
+    )
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def run_job(job):
+    """
+    Выполняет задачу. При ошибке задача возвращается в очередь
+    с задержкой, а после max_attempts попыток помечается ошибочной.
+    Результат записывается, только если задача всё ещё за этим
+    воркером: requeue_stale мог вернуть её в очередь и отдать другому.
+    """
+    handler = _handlers.get(job.name)
+    mine = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by
+    )
+    try:
+        if handler is None:
+            raise LookupError(f'Неизвестная задача: {job.name}.')
+        handler(*job.args)
+    except Exception:
+        now = timezone.now()
+        retry = handler is not None and job.attempts < job.max_attempts
+        mine.update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_at=now + retry_delay(job.attempts) if retry else job.run_at,
+            finished_at=None if retry else now,
+            locked_by='',
+            last_error=traceback.format_exc()
+        )
+        logger.warning(
+            'Задача %s завершилась ошибкой (попытка %s из %s)',
+            job, job.attempts, job.max_attempts, exc_info=True
+        )
+        return False
+    mine.update(status=Job.DONE, finished_at=timezone.now(), locked_by='')
+    return True
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи, которые дольше JOBS_LOCK_TIMEOUT
+    числятся выполняемыми: их воркер, скорее всего, остановился.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_at=now, locked_by=''
+    )
+    failed = stale.update(
+        status=Job.FAILED, finished_at=now, locked_by='',
+        last_error='Воркер не завершил задачу за отведённое время.'
+    )
+    return requeued + failed
+
+
+def purge_finished():
+    """Удаляет выполненные задачи старше JOBS_KEEP_DONE секунд."""
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_KEEP_DONE
+        )
+    ).delete()[0]
+
+
+def _percentiles(values):
+    if not values:
+        return None, None
+    if len(values) == 1:
+        return values[0], values[0]
+    cuts = quantiles(values, n=20, method='inclusive')
+    return cuts[9], cuts[18]
+
+
+def queue_stats(window=15 * 60, sample=1000):
+    """
+    Метрики очереди: число задач по статусам, глубина готовой очереди,
+    возраст самой старой готовой задачи, а также медиана и 95-й
+    перцентиль ожидания в очереди и выполнения для задач, завершённых
+    за последние window секунд (не более sample последних).
+    """
+    now = timezone.now()
+    stats = {status: 0 for status, _ in Job.STATUSES}
+    stats.update(
+        Job.objects.order_by().values_list('status')
+        .annotate(total=Count('id'))
+    )
+    ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+    oldest = ready.order_by('run_at').values_list('run_at', flat=True)
+    oldest = oldest.first()
+    stats['ready'] = ready.count()
+    stats['oldest_ready_age'] = (
+        (now - oldest).total_seconds() if oldest else 0.0
+    )
+
+    recent = list(
+        Job.objects.filter(
+            status=Job.DONE, finished_at__gte=now - timedelta(seconds=window)
+        ).order_by('-finished_at').values_list(
+            'run_at', 'started_at', 'finished_at'
+        )[:sample]
+    )
+    waits = sorted(
+        max(0.0, (started - run_at).total_seconds())
+        for run_at, started, _ in recent
+    )
+    durations = sorted(
+        (finished - started).total_seconds()
+        for _, started, finished in recent
+    )
+    stats['wait_p50'], stats['wait_p95'] = _percentiles(waits)
+    stats['duration_p50'], stats['duration_p95'] = _percentiles(durations)
+    stats['done_per_minute'] = len(recent) * 60 / window
+    return stats
+
+
+def format_stats(stats):
+    """Однострочное представление метрик для логов и консоли."""
+    def seconds(value):
+        return '—' if value is None else f'{value:.2f} с'
+
+    return (
+        f'в очереди: {stats[Job.QUEUED]} (готовы: {stats["ready"]}, '
+        f'старейшая ждёт {seconds(stats["oldest_ready_age"])}), '
+        f'выполняются: {stats[Job.RUNNING]}, ошибок: {stats[Job.FAILED]}, '
+        f'выполнено: {stats[Job.DONE]} '
+        f'({stats["done_per_minute"]:.1f}/мин); '
+        f'ожидание p50/p95: {seconds(stats["wait_p50"])}/'
+        f'{seconds(stats["wait_p95"])}, '
+        f'выполнение p50/p95: {seconds(stats["duration_p50"])}/'
+        f'{seconds(stats["duration_p95"])}'
+    )
@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db.models import Count
 
 from .models import IngredientInRecipe, Recipe
 
@@ -20,10 +19,16 @@ class RecipeAdmin(admin.ModelAdmin):
 
     inlines = (IngredientInRecipeInline,)
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        return queryset.annotate(fav_count=Count('in_favorites'))
-
-    @admin.display(description='В избранном', ordering='fav_count')
+    def save_model(self, request, obj, form, change):
+        # Счётчики меняются сигналами через F(): при изменении
+        # сохраняются только поля, отредактированные в форме.
+        if not change:
+            return super().save_model(request, obj, form, change)
+        fields = {field.name for field in obj._meta.concrete_fields}
+        obj.save(update_fields=[
+            name for name in form.changed_data if name in fields
+        ])
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorites_count(self, obj):
-        return obj.fav_count
+        return obj.favorites_count
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import (IngredientInRecipe, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from recipes.shopping_list import change_shopping_lists, lock_users
+from recipes.signals import bulk_change
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def total_amounts(recipe_ids):
+    """Суммарные количества ингредиентов рецептов: {ingredient_id: amount}."""
+    return dict(
+        IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id').annotate(total=Sum('amount')).order_by()
+        .values_list('ingredient_id', 'total')
+    )
+
+
+@transaction.atomic
+def add_to_shopping_cart(user, recipe_ids):
+    """
+    Добавляет рецепты в корзину одним INSERT, пропуская уже
+    добавленные, и переносит их в счётчики и список покупок так же,
+    как сигналы ShoppingCart для одной строки. Возвращает id добавленных.
+    """
+    lock_users((user.pk,))
+    existing = set(
+        user.shopping_cart.filter(recipe_id__in=recipe_ids)
+        .values_list('recipe_id', flat=True)
+    )
+    added = [pk for pk in dict.fromkeys(recipe_ids) if pk not in existing]
+    ShoppingCart.objects.bulk_create(
+        [ShoppingCart(user=user, recipe_id=pk) for pk in added],
+        ignore_conflicts=True
+    )
+    Recipe.objects.filter(pk__in=added).update(
+        shopping_cart_count=F('shopping_cart_count') + 1
+    )
+    change_shopping_lists((user.pk,), total_amounts(added))
+    return added
+
+
+@transaction.atomic
+def clear_shopping_cart(user):
+    """
+    Очищает корзину и список покупок пользователя одним DELETE.
+    Обработчики строк корзины отключены: счётчики рецептов
+    уменьшаются одним UPDATE, список покупок удаляется целиком.
+    Возвращает число удалённых рецептов.
+    """
+    lock_users((user.pk,))
+    cart = ShoppingCart.objects.filter(user=user)
+    recipe_ids = list(cart.values_list('recipe_id', flat=True))
+    with bulk_change():
+        cart.delete()
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        shopping_cart_count=F('shopping_cart_count') - 1
+    )
+    ShoppingListItem.objects.filter(user=user).delete()
+    return len(recipe_ids)
+
+
+@transaction.atomic
+def subscribe_many(user, author_ids):
+    """
+    Подписывает пользователя на авторов одним INSERT, пропуская
+    существующие подписки, и обновляет счётчики подписчиков.
+    Возвращает id авторов, подписка на которых добавлена.
+    """
+    lock_users((user.pk,))
+    existing = set(
+        user.follower.filter(author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+    added = [pk for pk in dict.fromkeys(author_ids) if pk not in existing]
+    Subscription.objects.bulk_create(
+        [Subscription(user=user, author_id=pk) for pk in added],
+        ignore_conflicts=True
+    )
+    User.objects.filter(pk__in=added).update(
+        followers_count=F('followers_count') + 1
+    )
+    return added
+
+
+@transaction.atomic
+def unsubscribe_many(user, author_ids):
+    """
+    Отписывает пользователя от авторов одним DELETE и уменьшает
+    счётчики подписчиков одним UPDATE. Возвращает id авторов,
+    подписка на которых была удалена.
+    """
+    lock_users((user.pk,))
+    subscriptions = user.follower.filter(author_id__in=author_ids)
+    removed = list(subscriptions.values_list('author_id', flat=True))
+    with bulk_change():
+        subscriptions.delete()
+    User.objects.filter(pk__in=removed).update(
+        followers_count=F('followers_count') - 1
+    )
+    return removed
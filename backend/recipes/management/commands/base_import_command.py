@@ -1,52 +1,245 @@
+import csv
 import json
+import os
+import time
+from functools import reduce
+from itertools import islice
+from operator import or_
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+
+from api.cache import bump_versions
+from api.snapshots import get_catalog_snapshot
+
+# Размер блока, которым читается JSON-файл.
+READ_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """
+    Потоково разбирает JSON-массив объектов, не загружая файл целиком:
+    в памяти держится только текущий блок и недочитанный объект.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    started = eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Неожиданный конец JSON-массива.')
+            buffer, position = file.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError('Ожидался JSON-массив объектов.')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if not isinstance(item, dict):
+            raise ValueError('Элементы JSON-массива должны быть объектами.')
+        yield item
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class BaseImportCommand(BaseCommand):
     model = None
     default_file = ''
+    # Версии кэша, которые устаревают после импорта.
+    cache_versions = ()
+    # Снимок каталога, пересобираемый после импорта.
+    catalog = None
+    # Поля, по которым запись из файла сопоставляется с существующей,
+    # и поля, которые обновляются в режиме --upsert.
+    unique_fields = ()
+    update_fields = ()
 
     @property
     def object_name(self):
         return self.model._meta.verbose_name_plural
 
+    @property
+    def csv_fields(self):
+        """Порядок колонок CSV-файла без заголовка."""
+        return (*self.unique_fields, *self.update_fields)
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--file',
             type=str,
             default=self.default_file,
-            help=f'Путь к JSON-файлу с {self.object_name}.',
+            help=f'Путь к JSON- или CSV-файлу с {self.object_name}.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('json', 'csv'),
+            help='Формат файла; по умолчанию — по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одном INSERT.',
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help=(
+                'Обновлять существующие записи '
+                f'(поля: {", ".join(self.update_fields)}).'
+            ),
         )
 
+    def read_rows(self, file, file_format):
+        """Записи файла по одной: словари {поле: значение}."""
+        if file_format == 'json':
+            yield from iter_json_array(file)
+            return
+        reader = csv.reader(file)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = tuple(column.strip() for column in first)
+        if set(header) >= set(self.csv_fields):
+            fields = header
+        else:
+            fields = self.csv_fields
+            yield dict(zip(fields, first))
+        for row in reader:
+            if row:
+                yield dict(zip(fields, row))
+
+    def build(self, row):
+        """Экземпляр модели из записи файла со значениями нужных типов."""
+        return self.model(**{
+            name: self.model._meta.get_field(name).to_python(row.get(name))
+            for name in self.csv_fields
+        })
+
+    def key(self, obj):
+        return tuple(getattr(obj, name) for name in self.unique_fields)
+
+    def existing(self, keys):
+        """Текущие значения update_fields записей с ключами keys."""
+        if len(self.unique_fields) == 1:
+            lookup = Q(**{f'{self.unique_fields[0]}__in': [
+                key[0] for key in keys
+            ]})
+        else:
+            lookup = reduce(or_, (
+                Q(**dict(zip(self.unique_fields, key))) for key in keys
+            ))
+        return {
+            tuple(values[:len(self.unique_fields)]):
+            tuple(values[len(self.unique_fields):])
+            for values in self.model.objects.filter(lookup).values_list(
+                *self.unique_fields, *self.update_fields
+            )
+        }
+
+    def import_batch(self, rows, upsert):
+        """
+        Записывает пачку одним INSERT и возвращает числа созданных,
+        обновлённых и пропущенных записей. Созданные и обновлённые
+        считаются по выборке существующих ключей. Конфликт по другому
+        уникальному ограничению (или с записью, добавленной после
+        выборки) не пропускается молча: IntegrityError прерывает
+        импорт и откатывает его целиком.
+        """
+        objs = {}
+        for row in rows:
+            obj = self.build(row)
+            objs[self.key(obj)] = obj
+        skipped = len(rows) - len(objs)
+        current = self.existing(objs)
+        new = [obj for key, obj in objs.items() if key not in current]
+        changed = [
+            obj for key, obj in objs.items()
+            if upsert and key in current and current[key] != tuple(
+                getattr(obj, name) for name in self.update_fields
+            )
+        ]
+        skipped += len(objs) - len(new) - len(changed)
+        if changed:
+            self.model.objects.bulk_create(
+                new + changed,
+                update_conflicts=True,
+                unique_fields=self.unique_fields,
+                update_fields=self.update_fields
+            )
+        elif new:
+            self.model.objects.bulk_create(new)
+        return len(new), len(changed), skipped
+
     def handle(self, **options):
         file_path = options['file']
         name_upper = self.object_name.upper()
-
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        objs = [self.model(**item) for item in data]
+        file_format = options['format'] or (
+            'csv' if os.path.splitext(file_path)[1].lower() == '.csv'
+            else 'json'
+        )
+        created = updated = skipped = total = 0
+        started = time.perf_counter()
 
         try:
-            created_objects = self.model.objects.bulk_create(
-                objs,
-                ignore_conflicts=True
+            with open(file_path, 'r', encoding='utf-8', newline='') as file:
+                with transaction.atomic():
+                    for batch in batched(
+                        self.read_rows(file, file_format),
+                        max(1, options['batch_size'])
+                    ):
+                        counts = self.import_batch(batch, options['upsert'])
+                        created += counts[0]
+                        updated += counts[1]
+                        skipped += counts[2]
+                        total += len(batch)
+                        elapsed = time.perf_counter() - started
+                        self.stdout.write(
+                            f'Обработано записей: {total} '
+                            f'({total / elapsed:.0f} записей/с)',
+                            ending='\r'
+                        )
+                    if created or updated:
+                        bump_versions(*self.cache_versions)
+        except (OSError, ValueError, DatabaseError) as error:
+            raise CommandError(
+                f'Ошибка при загрузке {self.object_name} '
+                f'из {file_path} (после записи {total}): {error}'
             )
-            created_count = len(created_objects)
-
-        except Exception as error:
-            self.stdout.write(
-                self.style.ERROR(
-                    f'Ошибка при загрузке {self.object_name} '
-                    f'из {file_path}: {error}'
-                )
-            )
-            return
+        if self.catalog and (created or updated):
+            get_catalog_snapshot(self.catalog)
 
+        elapsed = time.perf_counter() - started
         self.stdout.write(f'\n{"=" * 50}')
         self.stdout.write(
             self.style.SUCCESS(
                 f'{name_upper} ИМПОРТИРОВАНЫ: '
             )
         )
-        self.stdout.write(f'Создано новых записей: {created_count}')
+        self.stdout.write(f'Создано новых записей: {created}')
+        self.stdout.write(f'Обновлено записей: {updated}')
+        self.stdout.write(f'Пропущено записей: {skipped}')
+        self.stdout.write(
+            f'Время: {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} записей/с)'
+        )
@@ -0,0 +1,81 @@
+import base64
+import io
+import math
+import os
+import time
+import tracemalloc
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+from rest_framework import serializers
+
+from api.fields import Base64ImageField
+
+
+class InMemoryBase64ImageField(serializers.ImageField):
+    """Прежний способ: split и декодирование всей строки целиком."""
+
+    def to_internal_value(self, data):
+        format_part, imgstr = data.split(';base64,')
+        ext = format_part.split('/')[-1]
+        data = ContentFile(
+            base64.b64decode(imgstr), name=f'{uuid.uuid4()}.{ext}'
+        )
+        return super().to_internal_value(data)
+
+
+def noise_png(size):
+    """PNG из случайных пикселей: почти не сжимается, ~size байт."""
+    side = math.isqrt(size // 3)
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пикового потребления памяти полем изображения '
+        'при разборе Base64'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=float,
+            nargs='+',
+            default=(1, 5, 9),
+            help='Размеры изображений в мегабайтах.',
+        )
+
+    def measure(self, field, data):
+        tracemalloc.start()
+        started = time.perf_counter()
+        file = field.to_internal_value(data)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        file.close()
+        return peak, elapsed
+
+    def handle(self, **options):
+        fields = (InMemoryBase64ImageField(), Base64ImageField())
+        self.stdout.write(
+            'Размер, МБ | в памяти: пик МБ, мс | частями: пик МБ, мс'
+        )
+        for size in options['sizes']:
+            encoded = base64.b64encode(
+                noise_png(int(size * 1024 * 1024))
+            ).decode()
+            data = 'data:image/png;base64,' + encoded
+            del encoded
+            (old_peak, old_time), (new_peak, new_time) = (
+                self.measure(field, data) for field in fields
+            )
+            self.stdout.write(
+                f'{size:10.1f} | {old_peak / 2 ** 20:9.1f} '
+                f'{old_time * 1000:7.1f} | {new_peak / 2 ** 20:9.1f} '
+                f'{new_time * 1000:7.1f}'
+            )
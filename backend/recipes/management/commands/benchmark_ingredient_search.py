@@ -0,0 +1,121 @@
+import csv
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.search import IngredientSearchIndex
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение поиска ингредиентов по индексу в памяти '
+        'с запросом name__icontains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            default='data/ingredients.csv',
+            help='CSV-файл с ингредиентами (название, единица измерения).',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=200_000,
+            help='Размер синтетического набора (0 — не проверять).',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Количество поисковых запросов на набор.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Ограничение числа результатов поиска.',
+        )
+
+    def handle(self, **options):
+        with open(options['file'], encoding='utf-8') as file:
+            rows = [(name, unit) for name, unit in csv.reader(file)]
+        self.benchmark('CSV', rows, options)
+        if options['synthetic']:
+            self.benchmark(
+                'синтетический', self.synthetic(rows, options['synthetic']),
+                options
+            )
+
+    def synthetic(self, rows, size):
+        words = sorted({word for name, _ in rows for word in name.split()})
+        units = sorted({unit for _, unit in rows})
+        rng = random.Random(0)
+        return [
+            (
+                f'{" ".join(rng.sample(words, 2))} {number}',
+                rng.choice(units)
+            )
+            for number in range(size)
+        ]
+
+    def benchmark(self, title, rows, options):
+        rng = random.Random(1)
+        names = [name for name, _ in rows]
+        queries = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            start = rng.randrange(len(name))
+            queries.append(name[start:start + rng.randint(1, 6)])
+        limit = options['limit']
+
+        # Индекс строится из строк набора в памяти. Для сравнения с ORM
+        # строки добавляются к существующим ингредиентам во временной
+        # транзакции и откатываются; имеющиеся данные не трогаются.
+        started = time.perf_counter()
+        index = IngredientSearchIndex(
+            (number, name, unit)
+            for number, (name, unit) in enumerate(rows, 1)
+        )
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query, limit=limit)
+        index_time = time.perf_counter() - started
+
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in rows),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            started = time.perf_counter()
+            for query in queries:
+                list(
+                    Ingredient.objects
+                    .filter(name__icontains=query)
+                    .values_list('id', 'name', 'measurement_unit')[:limit]
+                )
+            orm_time = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'\n{"=" * 50}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Набор «{title}»: {len(rows)} строк, {len(queries)} запросов'
+        ))
+        self.stdout.write(f'Построение индекса: {build_time * 1000:.1f} мс')
+        self.stdout.write(
+            f'ORM name__icontains: '
+            f'{orm_time / len(queries) * 1000:.3f} мс/запрос'
+        )
+        self.stdout.write(
+            f'Индекс в памяти: '
+            f'{index_time / len(queries) * 1000:.3f} мс/запрос'
+        )
@@ -0,0 +1,141 @@
+import random
+import time
+from statistics import quantiles
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from api.search import search_recipes
+from recipes.management.commands.base_import_command import batched
+from recipes.models import Recipe
+
+User = get_user_model()
+
+WORDS = (
+    'борщ суп щи солянка уха рассольник окрошка салат винегрет оливье '
+    'котлеты голубцы пельмени вареники блины оладьи сырники запеканка '
+    'каша плов рагу жаркое гуляш бефстроганов пирог пирожки кулебяка '
+    'картошка капуста свёкла морковь лук чеснок укроп петрушка грибы '
+    'курица говядина свинина баранина рыба сельдь лосось творог сметана '
+    'сливки масло мука яйца сахар соль перец лавровый тушить варить '
+    'жарить запекать обжарить нарезать натереть смешать посолить подавать '
+    'горячим холодным домашний быстрый праздничный постный деревенский'
+).split()
+# Редкие слова: составные, каждое встречается примерно в 0,15 % рецептов.
+RARE_WORDS = [first + second for first in WORDS for second in WORDS]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение полнотекстового поиска рецептов (?search=) '
+        'с запросом name/text__icontains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=500_000,
+            help='Количество синтетических рецептов.',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=100,
+            help='Количество поисковых запросов.',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=6,
+            help='Размер страницы результатов.',
+        )
+
+    def synthetic(self, author, size):
+        rng = random.Random(0)
+        for number in range(size):
+            yield Recipe(
+                author=author,
+                name=f'{" ".join(rng.sample(WORDS, 3))} {number}',
+                text=' '.join(
+                    rng.choices(WORDS, k=30) + rng.choices(RARE_WORDS, k=10)
+                ),
+                cooking_time=rng.randint(1, 180),
+                image='recipes/images/benchmark.jpg',
+            )
+
+    def measure(self, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append(time.perf_counter() - started)
+        cuts = quantiles(timings, n=20, method='inclusive')
+        return cuts[9] * 1000, cuts[18] * 1000
+
+    def handle(self, **options):
+        size = options['recipes']
+        page_size = options['page_size']
+        rng = random.Random(1)
+        query_sets = {
+            'частые слова': [
+                ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+                for _ in range(options['queries'])
+            ],
+            'редкие слова': rng.sample(RARE_WORDS, options['queries']),
+        }
+        ordering = ('-pub_date', '-id')
+
+        def full_text(query):
+            found = search_recipes(
+                Recipe.objects.only('id', 'pub_date'), query
+            )
+            found.count()
+            list(found.order_by('-search_rank', *ordering)[:page_size])
+
+        def icontains(query):
+            lookup = Q()
+            for word in query.split():
+                lookup &= Q(name__icontains=word) | Q(text__icontains=word)
+            found = Recipe.objects.only('id', 'pub_date').filter(lookup)
+            found.count()
+            list(found.order_by(*ordering)[:page_size])
+
+        # Данные вставляются во временной транзакции и откатываются.
+        with transaction.atomic():
+            author = User.objects.create(
+                username='search-benchmark',
+                email='search-benchmark@example.org',
+            )
+            started = time.perf_counter()
+            for batch in batched(self.synthetic(author, size), 5000):
+                Recipe.objects.bulk_create(batch)
+            insert_time = time.perf_counter() - started
+
+            timings = {
+                title: (
+                    self.measure(queries, full_text),
+                    self.measure(queries, icontains),
+                )
+                for title, queries in query_sets.items()
+            }
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'\n{"=" * 50}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{connection.vendor}: {size} рецептов, '
+            f'{options["queries"]} запросов в каждом наборе'
+        ))
+        self.stdout.write(
+            f'Вставка с обновлением индекса: {insert_time:.1f} с '
+            f'({size / insert_time:.0f} рецептов/с)'
+        )
+        for title, (search, icontains) in timings.items():
+            self.stdout.write(
+                f'{title.capitalize()}, p50/p95: полнотекстовый поиск '
+                f'{search[0]:.1f}/{search[1]:.1f} мс, icontains '
+                f'{icontains[0]:.1f}/{icontains[1]:.1f} мс'
+            )
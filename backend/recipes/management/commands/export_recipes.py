@@ -0,0 +1,98 @@
+import json
+import sys
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import IngredientInRecipe, Recipe
+from recipes.transfer import CopyPool, export_image, recipe_record
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в NDJSON (по рецепту на строку)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            default='-',
+            help='Путь к NDJSON-файлу; «-» — стандартный вывод.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, читаемых из БД за раз.',
+        )
+        parser.add_argument(
+            '--images-dir',
+            type=str,
+            help='Скопировать файлы изображений в эту папку.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков, копирующих изображения.',
+        )
+
+    def handle(self, **options):
+        # iterator() читает рецепты курсором пачками по batch_size
+        # и предзагружает теги и ингредиенты для каждой пачки.
+        recipes = (
+            Recipe.objects.select_related('author')
+            .only(
+                'name', 'text', 'cooking_time', 'pub_date', 'image',
+                'author__email'
+            )
+            .prefetch_related(
+                'tags',
+                Prefetch(
+                    'ingredient_amounts',
+                    queryset=IngredientInRecipe.objects.select_related(
+                        'ingredient'
+                    )
+                )
+            )
+            .order_by('pk')
+            .iterator(chunk_size=max(1, options['batch_size']))
+        )
+        images_dir = options['images_dir']
+        copy = partial(export_image, images_dir=images_dir)
+        failed = []
+
+        def collect_error(future):
+            if future.exception():
+                failed.append(future.exception())
+
+        total = 0
+        started = time.perf_counter()
+        output = (
+            sys.stdout if options['file'] == '-'
+            else open(options['file'], 'w', encoding='utf-8')
+        )
+        try:
+            with CopyPool(max(1, options['workers'])) as pool:
+                for recipe in recipes:
+                    output.write(json.dumps(
+                        recipe_record(recipe), ensure_ascii=False
+                    ) + '\n')
+                    if images_dir and recipe.image.name:
+                        pool.submit(
+                            copy, recipe.image.name
+                        ).add_done_callback(collect_error)
+                    total += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        for error in failed:
+            self.stderr.write(f'Ошибка копирования изображения: {error}')
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total}, ошибок копирования: '
+            f'{len(failed)}, {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} рецептов/с)'
+        ))
@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                ProcessPoolExecutor, wait)
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.images import (DERIVATIVE_FIELDS, get_widths, needs_derivatives,
+                        read_source, render_derivatives, store_derivatives)
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение уменьшенных копий изображений рецептов и аватаров, '
+        'для которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов, рендерящих копии.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить копии и для уже обработанных изображений.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество объектов, выбираемых из БД за раз.',
+        )
+
+    def pending(self, model, force, batch_size):
+        """id объектов с изображением, копии которых нужно построить."""
+        field, manifest_field, *_ = DERIVATIVE_FIELDS[model._meta.label]
+        queryset = (
+            model.objects.exclude(**{field: ''}).exclude(**{field: None})
+            .order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk)
+                .only('pk', field, manifest_field)[:batch_size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield from (
+                instance.pk for instance in batch
+                if force or needs_derivatives(instance)
+            )
+
+    def handle(self, **options):
+        # Дочерние процессы не должны наследовать соединения с БД.
+        connections.close_all()
+        workers = max(1, options['workers'])
+        started = time.perf_counter()
+        processed = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for model in (Recipe, User):
+                widths = get_widths(model)
+                in_flight = {}
+                for pk in self.pending(
+                    model, options['force'], options['batch_size']
+                ):
+                    # Не больше двух изображений в памяти на процесс.
+                    if len(in_flight) >= workers * 2:
+                        processed, failed = self.collect(
+                            model, in_flight, processed, failed,
+                            FIRST_COMPLETED
+                        )
+                    prepared = read_source(model, pk, options['force'])
+                    if prepared is None:
+                        continue
+                    source, content = prepared
+                    future = executor.submit(
+                        render_derivatives, content, widths
+                    )
+                    in_flight[future] = (pk, source)
+                processed, failed = self.collect(
+                    model, in_flight, processed, failed
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, ошибок: {failed}, '
+            f'{processed / elapsed if elapsed else 0:.1f} изобр./с'
+        ))
+
+    def collect(self, model, in_flight, processed, failed,
+                return_when=ALL_COMPLETED):
+        """Сохраняет готовые копии и убирает их задачи из in_flight."""
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            pk, source = in_flight.pop(future)
+            try:
+                store_derivatives(model, pk, source, future.result())
+            except Exception as error:
+                failed += 1
+                self.stderr.write(
+                    f'{model._meta.label} {pk}: {source}: {error}'
+                )
+            else:
+                processed += 1
+        return processed, failed
@@ -0,0 +1,239 @@
+import json
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from api.cache import RECIPE_IDS_VERSION, RECIPES_VERSION, bump_versions
+from jobs.queue import enqueue_many
+from recipes.management.commands.base_import_command import batched
+from recipes.models import (MAX_VALUE, MIN_VALUE, Ingredient,
+                            IngredientInRecipe, Recipe, Tag)
+from recipes.signals import change_counter
+from recipes.transfer import CopyPool, import_image
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из NDJSON, выгруженного export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            default='-',
+            help='Путь к NDJSON-файлу; «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции.',
+        )
+        parser.add_argument(
+            '--images-dir',
+            type=str,
+            help=(
+                'Папка с файлами изображений из export_recipes; без неё '
+                'файлы должны уже лежать в хранилище.'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков, копирующих изображения.',
+        )
+
+    def read_records(self, file):
+        """Пары (номер строки, запись); некорректные строки — None."""
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as error:
+                self.fail(line_number, f'некорректный JSON: {error}')
+                continue
+            if not isinstance(record, dict):
+                self.fail(line_number, 'запись должна быть JSON-объектом')
+                continue
+            yield line_number, record
+
+    def fail(self, line_number, reason):
+        self.failed += 1
+        self.stderr.write(f'Строка {line_number}: {reason}')
+
+    def build(self, line_number, record, authors):
+        """
+        Рецепт, id тегов и количества ингредиентов из записи, либо None,
+        если запись ссылается на неизвестные объекты или некорректна.
+        """
+        try:
+            author_id = authors.get(record['author'])
+            tag_ids = [self.tags.get(slug) for slug in record['tags']]
+            amounts = {}
+            for item in record['ingredients']:
+                key = (item['name'], item['measurement_unit'])
+                if key not in self.ingredients or key in amounts:
+                    return self.fail(
+                        line_number,
+                        f'неизвестный или повторяющийся ингредиент {key}'
+                    )
+                amounts[key] = int(item['amount'])
+            cooking_time = int(record['cooking_time'])
+            pub_date = (
+                datetime.fromisoformat(record['pub_date'])
+                if record.get('pub_date') else timezone.now()
+            )
+            recipe = Recipe(
+                name=record['name'],
+                author_id=author_id,
+                text=record['text'],
+                cooking_time=cooking_time,
+                image=record['image'],
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            return self.fail(line_number, f'некорректная запись: {error!r}')
+        if author_id is None:
+            return self.fail(line_number, 'неизвестный автор')
+        if None in tag_ids or not tag_ids:
+            return self.fail(line_number, 'неизвестные или пустые теги')
+        if not amounts or not all(
+            MIN_VALUE <= value <= MAX_VALUE
+            for value in (cooking_time, *amounts.values())
+        ):
+            return self.fail(
+                line_number, 'нет ингредиентов или значение вне диапазона'
+            )
+        return recipe, pub_date, set(tag_ids), {
+            self.ingredients[key]: amount for key, amount in amounts.items()
+        }
+
+    def import_batch(self, batch, pool, images_dir):
+        """Создаёт рецепты пачки тремя bulk_create в одной транзакции."""
+        names = {record.get('name') for _, record in batch}
+        existing = set(
+            Recipe.objects.filter(name__in=names)
+            .values_list('name', flat=True)
+        )
+        authors = dict(
+            User.objects.filter(
+                email__in={record.get('author') for _, record in batch}
+            ).values_list('email', 'pk')
+        )
+        rows = []
+        for line_number, record in batch:
+            if record.get('name') in existing:
+                self.skipped += 1
+                continue
+            row = self.build(line_number, record, authors)
+            if row:
+                existing.add(row[0].name)
+                rows.append((line_number, row))
+
+        if images_dir:
+            saved = pool.map(
+                partial(import_image, images_dir=images_dir),
+                [row[0].image.name for _, row in rows]
+            )
+            copied = []
+            for (line_number, row), name in zip(rows, saved):
+                if isinstance(name, Exception):
+                    self.fail(line_number, f'изображение: {name}')
+                    continue
+                row[0].image = name
+                copied.append((line_number, row))
+            rows = copied
+        if not rows:
+            return
+
+        recipes = [row[0] for _, row in rows]
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create проставляет auto_now_add-дату, возвращаем
+            # исходные даты публикации одним UPDATE.
+            for recipe, (_, (_, pub_date, _, _)) in zip(recipes, rows):
+                recipe.pub_date = pub_date
+            Recipe.objects.bulk_update(recipes, ('pub_date',))
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe, (_, (_, _, tag_ids, _)) in zip(recipes, rows)
+                for tag_id in tag_ids
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe_id=recipe.pk, ingredient_id=pk, amount=amount
+                )
+                for recipe, (_, (_, _, _, amounts)) in zip(recipes, rows)
+                for pk, amount in amounts.items()
+            )
+            # bulk_create не вызывает сигналы: счётчики рецептов авторов
+            # и генерацию уменьшенных копий обновляем сами.
+            for author_id, count in Counter(
+                recipe.author_id for recipe in recipes
+            ).items():
+                change_counter(User, author_id, 'recipes_count', count)
+            enqueue_many('images.derivatives', (
+                ('recipes.Recipe', recipe.pk) for recipe in recipes
+            ))
+        self.created += len(recipes)
+
+    def handle(self, **options):
+        self.created = self.skipped = self.failed = 0
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        images_dir = options['images_dir']
+        started = time.perf_counter()
+        total = 0
+        input_file = (
+            sys.stdin if options['file'] == '-'
+            else open(options['file'], encoding='utf-8')
+        )
+        try:
+            with CopyPool(max(1, options['workers'])) as pool:
+                for batch in batched(
+                    self.read_records(input_file),
+                    max(1, options['batch_size'])
+                ):
+                    self.import_batch(batch, pool, images_dir)
+                    total += len(batch)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'Обработано рецептов: {total} '
+                        f'({total / elapsed:.0f} рецептов/с)',
+                        ending='\r'
+                    )
+        except DatabaseError as error:
+            raise CommandError(
+                f'Ошибка при загрузке рецептов (создано {self.created}, '
+                f'повторный запуск пропустит их): {error}'
+            )
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+            if self.created:
+                bump_versions(RECIPES_VERSION, RECIPE_IDS_VERSION)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'\n{"=" * 50}')
+        self.stdout.write(self.style.SUCCESS('РЕЦЕПТЫ ИМПОРТИРОВАНЫ: '))
+        self.stdout.write(f'Создано новых записей: {self.created}')
+        self.stdout.write(f'Пропущено существующих: {self.skipped}')
+        self.stdout.write(f'Ошибок: {self.failed}')
+        self.stdout.write(
+            f'Время: {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} записей/с)'
+        )
@@ -1,8 +1,13 @@
+from api.cache import INGREDIENTS_VERSION
 from recipes.management.commands.base_import_command import BaseImportCommand
 from recipes.models import Ingredient
 
 
 class Command(BaseImportCommand):
-    help = 'Загрузка ингредиентов из JSON файла'
+    help = 'Загрузка ингредиентов из JSON или CSV файла'
     model = Ingredient
+    cache_versions = (INGREDIENTS_VERSION,)
+    catalog = 'ingredients'
+    unique_fields = ('name',)
+    update_fields = ('measurement_unit',)
     default_file = 'data/ingredients.json'
@@ -1,8 +1,13 @@
+from api.cache import TAGS_VERSION
 from recipes.management.commands.base_import_command import BaseImportCommand
 from recipes.models import Tag
 
 
 class Command(BaseImportCommand):
-    help = 'Загрузка тегов из JSON файла'
+    help = 'Загрузка тегов из JSON или CSV файла'
     model = Tag
+    cache_versions = (TAGS_VERSION,)
+    catalog = 'tags'
+    unique_fields = ('slug',)
+    update_fields = ('name',)
     default_file = 'data/tags.json'
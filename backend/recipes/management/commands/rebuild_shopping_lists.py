@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_versions, shopping_list_version
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import actual_shopping_lists, rebuild_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересборка списков покупок из корзин пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, не исправляя их.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей, обрабатываемых за раз.',
+        )
+
+    def handle(self, **options):
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        batch_size = options['batch_size']
+        inconsistent = 0
+        last_pk = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]
+            actual = actual_shopping_lists(batch)
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.filter(user_id__in=batch)
+                .values_list('user_id', 'ingredient_id', 'amount')
+            }
+            wrong = {
+                user_id for user_id, _ in actual.keys() ^ stored.keys()
+            } | {
+                user_id for (user_id, ingredient_id), amount in actual.items()
+                if stored.get((user_id, ingredient_id)) != amount
+            }
+            inconsistent += len(wrong)
+            if wrong and not options['check']:
+                rebuild_shopping_lists(wrong)
+                bump_versions(*map(shopping_list_version, wrong))
+
+        if options['check']:
+            self.stdout.write(
+                f'Списков покупок с расхождениями: {inconsistent}'
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано списков покупок: {inconsistent}'
+        ))
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# (модель, поле-счётчик, модель связей, внешний ключ на модель).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+def actual_count(related_model, fk_name):
+    """Подзапрос с фактическим числом связанных записей."""
+    return Coalesce(
+        Subquery(
+            related_model.objects
+            .filter(**{fk_name: OuterRef('pk')})
+            .order_by()
+            .values(fk_name)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов, проверяемых за одну транзакцию.',
+        )
+
+    def handle(self, **options):
+        batch_size = options['batch_size']
+        for model, field, related_model, fk_name in COUNTERS:
+            repaired = 0
+            pks = model.objects.order_by('pk').values_list('pk', flat=True)
+            last_pk = 0
+            while True:
+                batch = list(pks.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1]
+                actual = actual_count(related_model, fk_name)
+                with transaction.atomic():
+                    wrong = list(
+                        model.objects
+                        .filter(pk__in=batch)
+                        .annotate(actual=actual)
+                        .exclude(**{field: F('actual')})
+                        .values_list('pk', flat=True)
+                    )
+                    if wrong:
+                        model.objects.filter(pk__in=wrong).update(
+                            **{field: actual}
+                        )
+                repaired += len(wrong)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'исправлено записей: {repaired}'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+from recipes.search_index import (FTS_TABLE, SQLITE_FILL, SQLITE_TABLE,
+                                  SQLITE_TRIGGERS)
+
+# PostgreSQL: вычисляемый столбец tsvector с русской морфологией
+# (название весомее описания) и GIN-индекс по нему. Столбец
+# пересчитывает сама СУБД при любом INSERT и UPDATE, включая bulk_create.
+POSTGRES_FORWARD = (
+    """
+    ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    """
+    CREATE INDEX recipes_recipe_search_idx
+    ON recipes_recipe USING GIN (search_vector)
+    """,
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+# SQLite: таблица FTS5 с триггерами (см. recipes.search_index). Если
+# будущая миграция пересоздаст recipes_recipe, триггеры восстановит
+# обработчик post_migrate.
+SQLITE_FORWARD = (SQLITE_TABLE, *SQLITE_TRIGGERS.values(), SQLITE_FILL)
+SQLITE_BACKWARD = (
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_TRIGGERS),
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({
+                'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD
+            }),
+            run({
+                'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD
+            }),
+        ),
+    ]
@@ -66,11 +66,33 @@ class Recipe(models.Model):
         related_name='recipes',
         verbose_name='Теги'
     )
+    image_derivatives = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            )
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('author', 'name'),
@@ -189,3 +211,63 @@ class ShoppingCart(models.Model):
             f'{self.user.username} добавил '
             f'"{self.recipe.name}" в список покупок.'
         )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается инкрементально при изменении корзины и состава
+    рецептов (см. recipes.shopping_list).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient} – {self.amount}'
+
+
+class RecipeSearch(models.Model):
+    """
+    Строка таблицы FTS5 полнотекстового поиска рецептов (только SQLite).
+
+    Таблицу создаёт и наполняет триггерами миграция recipes/0008
+    (см. recipes.search_index); модель нужна, чтобы соединять её
+    с рецептами в запросах ORM.
+    """
+
+    recipe = models.OneToOneField(
+        'Recipe',
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_row',
+    )
+    name = models.TextField()
+    text = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
@@ -0,0 +1,76 @@
+from django.db import connections, transaction
+
+# SQLite: таблица FTS5 с копией названия и описания рецепта, которую
+# синхронизируют триггеры. В копии «ё» заменена на «е»: unicode61
+# не снимает с неё диакритику.
+FTS_TABLE = 'recipes_recipe_fts'
+NORMALIZED = "replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+NEW_VALUES = (
+    f"new.id, {NORMALIZED.format(column='new.name')}, "
+    f"{NORMALIZED.format(column='new.text')}"
+)
+SQLITE_TABLE = f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, text, tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES ({NEW_VALUES});
+    END
+    """,
+    f'{FTS_TABLE}_delete': f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f'{FTS_TABLE}_update': f"""
+    CREATE TRIGGER {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES ({NEW_VALUES});
+    END
+    """,
+}
+SQLITE_FILL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, text)
+    SELECT {NEW_VALUES.replace('new.', '')} FROM recipes_recipe
+"""
+
+
+def restore_search_triggers(using='default', **kwargs):
+    """
+    Обработчик post_migrate. Пересоздание таблицы recipes_recipe
+    миграцией на SQLite (ALTER через копию таблицы) удаляет её
+    триггеры, и поиск молча перестаёт видеть новые рецепты.
+    Недостающие триггеры создаются заново, таблица FTS
+    перезаполняется. Возвращает имена созданных триггеров.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE name = %s OR tbl_name = 'recipes_recipe'",
+            (FTS_TABLE,)
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            # Миграция recipes/0008 не применена.
+            return []
+        missing = [
+            name for name in SQLITE_TRIGGERS if name not in existing
+        ]
+        if missing:
+            for name in missing:
+                cursor.execute(SQLITE_TRIGGERS[name])
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(SQLITE_FILL)
+    return missing
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientInRecipe, ShoppingListItem
+
+User = get_user_model()
+
+
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей до конца транзакции в порядке id:
+    изменения списка покупок и массовые операции одного пользователя
+    выполняются по очереди, а параллельные транзакции не создают одну
+    и ту же строку дважды.
+    """
+    list(
+        User.objects.select_for_update().filter(pk__in=user_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def recipe_amounts(recipe_id):
+    """Количества ингредиентов рецепта: {ingredient_id: amount}."""
+    return dict(
+        IngredientInRecipe.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+@transaction.atomic
+def change_shopping_lists(user_ids, deltas):
+    """
+    Прибавляет к спискам покупок пользователей user_ids изменения
+    количеств deltas ({ingredient_id: delta}); строки с нулевым
+    количеством удаляются. Строки пользователей блокируются до чтения
+    списка: иначе две транзакции, не найдя строку, вставят её обе и
+    вторая упадёт на unique_shopping_list_ingredient.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    lock_users(user_ids)
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta
+                    ))
+                continue
+            item.amount += delta
+            if item.amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+    ShoppingListItem.objects.bulk_create(to_create)
+    ShoppingListItem.objects.bulk_update(to_update, ('amount',))
+    ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def change_recipe_amounts(recipe, changes):
+    """
+    Переносит изменение состава рецепта ({ingredient_id: (было, стало)})
+    в списки покупок. Возвращает id пользователей с рецептом в корзине.
+    """
+    user_ids = list(
+        recipe.in_shopping_cart.values_list('user_id', flat=True)
+    )
+    change_shopping_lists(user_ids, {
+        pk: new - old for pk, (old, new) in changes.items()
+    })
+    return user_ids
+
+
+def actual_shopping_lists(user_ids):
+    """Списки покупок, посчитанные заново из корзин пользователей."""
+    return {
+        (row['recipe__in_shopping_cart__user'], row['ingredient']):
+        row['total']
+        for row in IngredientInRecipe.objects
+        .filter(recipe__in_shopping_cart__user__in=user_ids)
+        .values('recipe__in_shopping_cart__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    }
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids):
+    """Пересобирает списки покупок пользователей с нуля."""
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for (user_id, ingredient_id), amount
+        in actual_shopping_lists(user_ids).items()
+    )
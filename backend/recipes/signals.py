@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.shopping_list import change_shopping_lists, recipe_amounts
+from users.models import Subscription
+
+User = get_user_model()
+
+# Массовые операции recipes.bulk сами обновляют счётчики и списки
+# покупок одним запросом, пока флаг поднят, обработчики строк молчат.
+_bulk_change = ContextVar('bulk_change', default=False)
+
+
+@contextmanager
+def bulk_change():
+    """Отключает обновление счётчиков и списков покупок по строкам."""
+    token = _bulk_change.set(True)
+    try:
+        yield
+    finally:
+        _bulk_change.reset(token)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик field у объекта model с ключом pk."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', 1)
+        change_shopping_lists(
+            (instance.user_id,), recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleting(sender, instance, **kwargs):
+    if _bulk_change.get():
+        return
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # ещё не удалены.
+    change_shopping_lists(
+        (instance.user_id,),
+        {
+            ingredient_id: -amount for ingredient_id, amount
+            in recipe_amounts(instance.recipe_id).items()
+        }
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    if _bulk_change.get():
+        return
+    change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    if _bulk_change.get():
+        return
+    change_counter(User, instance.author_id, 'followers_count', -1)
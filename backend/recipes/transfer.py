@@ -0,0 +1,83 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+def recipe_record(recipe):
+    """
+    Запись NDJSON для выгрузки рецепта: автор, теги и ингредиенты
+    указываются естественными ключами (email, slug, название и единица),
+    изображение — именем файла в хранилище.
+    """
+    return {
+        'name': recipe.name,
+        'author': recipe.author.email,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': amount.ingredient.name,
+                'measurement_unit': amount.ingredient.measurement_unit,
+                'amount': amount.amount,
+            }
+            for amount in recipe.ingredient_amounts.all()
+        ],
+    }
+
+
+def export_image(name, images_dir):
+    """Копирует файл из хранилища в images_dir с тем же путём."""
+    target = os.path.join(images_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name) as source, open(target, 'wb') as file:
+        shutil.copyfileobj(source, file)
+    return name
+
+
+def import_image(name, images_dir):
+    """
+    Копирует файл images_dir/name в хранилище; возвращает имя, под
+    которым он сохранён (хранилище может изменить его при совпадении).
+    """
+    with open(os.path.join(images_dir, name), 'rb') as source:
+        return default_storage.save(name, File(source))
+
+
+class CopyPool:
+    """
+    Пул потоков для копирования файлов с ограниченной очередью:
+    задачи не копятся в памяти быстрее, чем выполняются.
+    """
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 4)
+
+    def submit(self, func, *args):
+        self.slots.acquire()
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def map(self, func, items):
+        """Выполняет func(item) для всех items; результаты или ошибки."""
+        futures = [self.submit(func, item) for item in items]
+        return [
+            future.exception() or future.result() for future in futures
+        ]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,6 +1,18 @@
 from django.contrib import admin
-from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 from .models import User
 
-admin.site.register(User, UserAdmin)
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+
+    def save_model(self, request, obj, form, change):
+        # Счётчики меняются сигналами через F(): при изменении
+        # сохраняются только поля, отредактированные в форме.
+        if not change:
+            return super().save_model(request, obj, form, change)
+        fields = {field.name for field in obj._meta.concrete_fields}
+        obj.save(update_fields=[
+            name for name in form.changed_data if name in fields
+        ])